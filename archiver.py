@@ -0,0 +1,24 @@
+import asyncio
+import logging
+
+from async_database import AsyncDatabase
+
+
+async def run_archiver(db: AsyncDatabase, interval: float, older_than_days: int, batch_size: int):
+    """Фоновый перенос давно закрытых заявок в архив небольшими порциями"""
+    while True:
+        try:
+            total = 0
+            while True:
+                moved = await db.archive_closed_tickets(older_than_days, batch_size)
+                total += moved
+                if moved < batch_size:
+                    break
+                # Между порциями отдаем запись другим запросам
+                await asyncio.sleep(0)
+            if total:
+                logging.info(f"Архивация завершена, перенесено заявок: {total}")
+        except Exception as e:
+            logging.error(f"Ошибка фоновой архивации: {e}")
+
+        await asyncio.sleep(interval)
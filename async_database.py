@@ -0,0 +1,335 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Optional, List, Dict
+
+from database import Database
+from blocked_database import BlockedDatabase
+from models import Ticket, TicketStatus
+from export import export_tickets
+from metrics import db_query_duration, group_commit_size, group_commit_latency
+
+
+class _ThreadedStore:
+    """Базовый класс: выполнение синхронных вызовов sqlite3 в выделенном потоке"""
+
+    def __init__(self, thread_name: str, read_workers: int = 0):
+        self._name = thread_name
+        # Один поток записи на базу: изменения выполняются последовательно и не блокируют event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{thread_name}-writer")
+        # Чтение идёт параллельно через пул соединений только для чтения
+        self._read_executor = None
+        if read_workers:
+            self._read_executor = ThreadPoolExecutor(max_workers=read_workers,
+                                                     thread_name_prefix=f"{thread_name}-reader")
+
+    def _timed(self, func, *args, **kwargs):
+        """Вызов в потоке базы с замером времени выполнения для метрик"""
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            db_query_duration.observe(time.perf_counter() - started, db=self._name, method=func.__name__)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Контекст (update_id для логов) переносится в поток базы
+        call = functools.partial(contextvars.copy_context().run, self._timed, func, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+    async def _read(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        executor = self._read_executor or self._executor
+        call = functools.partial(contextvars.copy_context().run, self._timed, func, *args, **kwargs)
+        return await loop.run_in_executor(executor, call)
+
+    def _shutdown(self):
+        if self._read_executor:
+            self._read_executor.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+
+
+class AsyncDatabase(_ThreadedStore):
+    """Асинхронный интерфейс к базе заявок"""
+
+    def __init__(self, db: Database, group_commit_ms: float = 0, group_commit_max_ops: int = 100):
+        super().__init__("tickets-db", db.pool.read_pool_size)
+        self.db = db
+
+        # Групповая запись: изменения копятся до group_commit_ms или group_commit_max_ops
+        # и сохраняются одним commit (0 - каждое изменение со своим commit)
+        self.group_commit_window = group_commit_ms / 1000
+        self.group_commit_max_ops = max(int(group_commit_max_ops), 1)
+        self._pending: List[tuple] = []
+        self._pending_since = 0.0
+        self._pending_event: Optional[asyncio.Event] = None
+        self._full_event: Optional[asyncio.Event] = None
+        self._group_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.group_commits = 0
+        self.group_commit_ops = 0
+
+    async def _write(self, func, *args):
+        """Изменение с отдельным commit или в составе группы; результат - после commit группы"""
+        if not self.group_commit_window:
+            return await self._run(func, *args)
+
+        loop = asyncio.get_running_loop()
+        if self._group_task is None:
+            self._pending_event = asyncio.Event()
+            self._full_event = asyncio.Event()
+            self._group_task = asyncio.create_task(self._group_commit_loop())
+
+        future = loop.create_future()
+        call = functools.partial(contextvars.copy_context().run, self._timed, func, *args)
+        if not self._pending:
+            self._pending_since = loop.time()
+        self._pending.append((call, future))
+        self._pending_event.set()
+        if len(self._pending) >= self.group_commit_max_ops:
+            self._full_event.set()
+        return await future
+
+    async def _group_commit_loop(self):
+        """Фоновая задача: сбор изменений в группы и их запись в потоке базы"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._pending_event.wait()
+            if not self._pending:
+                # Очередь разобрана после начала остановки (close)
+                return
+
+            # Ожидание остатка окна от первого изменения в очереди или заполнения группы
+            delay = self._pending_since + self.group_commit_window - loop.time()
+            if delay > 0 and len(self._pending) < self.group_commit_max_ops:
+                try:
+                    await asyncio.wait_for(self._full_event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending[:self.group_commit_max_ops]
+            del self._pending[:len(batch)]
+            since, self._pending_since = self._pending_since, loop.time()
+            # При остановке события не сбрасываются: очередь разбирается без ожидания окна
+            if not self._pending and not self._closing:
+                self._pending_event.clear()
+            if len(self._pending) < self.group_commit_max_ops and not self._closing:
+                self._full_event.clear()
+
+            await self._commit_batch(batch, since)
+
+    async def _commit_batch(self, batch: List[tuple], since: float):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self._executor, self._timed, self.db.run_batch, [call for call, _ in batch]
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.group_commits += 1
+        self.group_commit_ops += len(batch)
+        group_commit_size.observe(len(batch))
+        group_commit_latency.observe(loop.time() - since)
+        for (_, future), (ok, value) in zip(batch, results):
+            # Вызвавший обработчик мог быть отменен - изменение все равно сохранено,
+            # а ошибку кроме лога увидеть некому
+            if future.done():
+                if not ok:
+                    logging.error(f"Ошибка изменения в групповой записи: {value}")
+                continue
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def get_group_commit_stats(self) -> Dict:
+        """Статистика групповой записи"""
+        return {
+            'commits': self.group_commits,
+            'ops': self.group_commit_ops,
+            'avg_ops': round(self.group_commit_ops / self.group_commits, 1) if self.group_commits else 0,
+            'pending': len(self._pending)
+        }
+
+    async def add_ticket(self, user_id: int, full_name: str, room: str, problem: str) -> int:
+        """Добавление новой заявки"""
+        return await self._write(self.db.add_ticket, user_id, full_name, room, problem)
+
+    async def archive_closed_tickets(self, older_than_days: int, batch_size: int = 1000) -> int:
+        """Перенос одной порции давно закрытых заявок в архив"""
+        return await self._run(self.db.archive_closed_tickets, older_than_days, batch_size)
+
+    async def get_ticket(self, ticket_id: int) -> Optional[Ticket]:
+        """Получение заявки по ID"""
+        return await self._read(self.db.get_ticket, ticket_id)
+
+    async def update_ticket_status(self, ticket_id: int, status: TicketStatus,
+                                   closed_by: Optional[str] = None, response: Optional[str] = None):
+        """Обновление статуса заявки"""
+        return await self._write(self.db.update_ticket_status, ticket_id, status, closed_by, response)
+
+    async def transition_ticket(self, ticket_id: int, expected: TicketStatus, status: TicketStatus,
+                                closed_by: Optional[str] = None, response: Optional[str] = None) -> Optional[Ticket]:
+        """Смена статуса заявки с проверкой текущего статуса"""
+        return await self._write(self.db.transition_ticket, ticket_id, expected, status, closed_by, response)
+
+    async def take_ticket_to_work(self, ticket_id: int) -> Optional[Ticket]:
+        """Перевод открытой заявки в работу"""
+        return await self._write(self.db.take_ticket_to_work, ticket_id)
+
+    async def close_ticket(self, ticket_id: int, closed_by: str, response: Optional[str] = None) -> Optional[Ticket]:
+        """Закрытие заявки в работе"""
+        return await self._write(self.db.close_ticket, ticket_id, closed_by, response)
+
+    async def update_ticket_rating(self, ticket_id: int, rating: int, feedback: Optional[str] = None) -> bool:
+        """Обновление оценки заявки"""
+        return await self._write(self.db.update_ticket_rating, ticket_id, rating, feedback)
+
+    async def get_open_tickets(self) -> List[sqlite3.Row]:
+        """Получение всех открытых заявок (статус OPEN)"""
+        return await self._read(self.db.get_open_tickets)
+
+    async def get_in_progress_tickets(self) -> List[sqlite3.Row]:
+        """Получение всех заявок в работе (статус IN_PROGRESS)"""
+        return await self._read(self.db.get_in_progress_tickets)
+
+    async def get_tickets_page(self, status: TicketStatus, page_size: int = 10,
+                               after_id: Optional[int] = None, before_id: Optional[int] = None) -> Dict:
+        """Страница заявок по статусу (keyset-пагинация)"""
+        return await self._read(self.db.get_tickets_page, status, page_size, after_id, before_id)
+
+    async def count_tickets(self, status: TicketStatus) -> int:
+        """Количество заявок с указанным статусом"""
+        return await self._read(self.db.count_tickets, status)
+
+    async def get_closed_tickets(self) -> List[sqlite3.Row]:
+        """Получение всех закрытых заявок (статус CLOSED)"""
+        return await self._read(self.db.get_closed_tickets)
+
+    async def get_user_tickets(self, user_id: int) -> List[sqlite3.Row]:
+        """Получение заявок пользователя"""
+        return await self._read(self.db.get_user_tickets, user_id)
+
+    async def iter_user_tickets(self, user_id: int, batch_size: int = 20) -> AsyncIterator[sqlite3.Row]:
+        """Заявки пользователя порциями: следующая порция читается, когда закончилась текущая"""
+        after = None
+        while True:
+            rows = await self._read(self.db.get_user_tickets_batch, user_id, batch_size, after)
+            for row in rows:
+                yield row
+            if len(rows) < batch_size:
+                break
+            after = (rows[-1]['created_at'], rows[-1]['id'])
+
+    async def get_rated_tickets(self, limit: int = 10) -> List[sqlite3.Row]:
+        """Получение заявок с оценками"""
+        return await self._read(self.db.get_rated_tickets, limit)
+
+    async def search_tickets(self, text: str, limit: int = 10, offset: int = 0) -> Dict:
+        """Полнотекстовый поиск заявок"""
+        return await self._read(self.db.search_tickets, text, limit, offset)
+
+    async def get_rating_stats(self) -> Dict:
+        """Получение статистики оценок"""
+        return await self._read(self.db.get_rating_stats)
+
+    async def get_all_tickets(self) -> List[sqlite3.Row]:
+        """Получение всех заявок"""
+        return await self._read(self.db.get_all_tickets)
+
+    async def export_tickets(self, path: str, fmt: str = "csv", status: Optional[TicketStatus] = None,
+                             date_from: Optional[str] = None, date_to: Optional[str] = None) -> int:
+        """Потоковая выгрузка заявок в файл"""
+        return await self._read(export_tickets, self.db, path, fmt, status, date_from, date_to)
+
+    async def get_tickets_stats(self) -> Dict:
+        """Получение статистики по заявкам"""
+        return await self._read(self.db.get_tickets_stats)
+
+    def get_query_stats(self, limit: int = 10, order_by: str = 'total') -> Optional[Dict]:
+        """Статистика профилирования запросов (без обращения к базе)"""
+        return self.db.get_query_stats(limit, order_by)
+
+    def reset_query_stats(self):
+        """Сброс статистики профилирования"""
+        self.db.reset_query_stats()
+
+    def get_cache_stats(self) -> Optional[Dict]:
+        """Статистика кэша заявок (без обращения к базе)"""
+        return self.db.get_cache_stats()
+
+    async def close(self):
+        """Остановка потока базы данных и закрытие соединения
+
+        Текущая группа дописывается, оставшиеся изменения сохраняются группами без ожидания
+        окна; вызвавшие получают результат или ошибку как обычно.
+        """
+        self._closing = True
+        if self._group_task:
+            pending = len(self._pending)
+            self._pending_event.set()
+            self._full_event.set()
+            await self._group_task
+            self._group_task = None
+            if pending:
+                logging.info(f"Сохранены отложенные изменения при остановке: {pending}")
+        self._shutdown()
+        if self.group_commits:
+            stats = self.get_group_commit_stats()
+            logging.info(f"Групповая запись: {stats['ops']} изменений за {stats['commits']} commit "
+                         f"(в среднем {stats['avg_ops']})")
+        self.db.close()
+        logging.info("Поток базы данных заявок остановлен")
+
+
+class AsyncBlockedDatabase(_ThreadedStore):
+    """Асинхронный интерфейс к базе заблокированных пользователей"""
+
+    def __init__(self, blocked_db: BlockedDatabase):
+        super().__init__("blocked-db", blocked_db.pool.read_pool_size)
+        self.blocked_db = blocked_db
+
+    async def block_user(self, user_id: int, blocked_by: int, username: Optional[str] = None,
+                         first_name: Optional[str] = None, last_name: Optional[str] = None,
+                         reason: Optional[str] = None) -> bool:
+        """Блокировка пользователя"""
+        return await self._run(self.blocked_db.block_user, user_id, blocked_by, username,
+                               first_name, last_name, reason)
+
+    async def unblock_user(self, user_id: int) -> bool:
+        """Разблокировка пользователя"""
+        return await self._run(self.blocked_db.unblock_user, user_id)
+
+    async def is_user_blocked(self, user_id: int) -> bool:
+        """Проверка, заблокирован ли пользователь"""
+        # Проверка идёт по индексу в памяти, переключение на поток базы не нужно
+        return self.blocked_db.is_user_blocked(user_id)
+
+    async def reload_cache(self):
+        """Перезагрузка индекса заблокированных пользователей"""
+        return await self._run(self.blocked_db.reload_cache)
+
+    def get_cache_stats(self) -> Dict:
+        """Статистика индекса заблокированных пользователей"""
+        return self.blocked_db.get_cache_stats()
+
+    async def get_blocked_users(self) -> List[Dict]:
+        """Получение списка всех заблокированных пользователей"""
+        return await self._read(self.blocked_db.get_blocked_users)
+
+    async def get_blocked_user_info(self, user_id: int) -> Optional[Dict]:
+        """Получение информации о блокировке пользователя"""
+        return await self._read(self.blocked_db.get_blocked_user_info, user_id)
+
+    def close(self):
+        """Остановка потока базы данных и закрытие соединения"""
+        self._shutdown()
+        self.blocked_db.close()
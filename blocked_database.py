@@ -1,22 +1,48 @@
-import sqlite3
 import logging
 from datetime import datetime
-from typing import Optional, List, Dict
+from typing import Optional, List, Dict, Set, Iterable
+from connection_manager import ConnectionManager
+from migrations import Migration, migrate
 
 
 class BlockedDatabase:
-    def __init__(self, db_name: str = "blocked_users.db"):
+    def __init__(self, db_name: str = "blocked_users.db", journal_mode: str = "WAL", synchronous: str = "NORMAL",
+                 busy_timeout: int = 5000, read_pool_size: int = 2):
         self.db_name = db_name
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.read_pool_size = read_pool_size
+        self.pool = None
         self.conn = None
+
+        # Индекс заблокированных ID в памяти для проверки без обращения к диску
+        self.blocked_ids: Set[int] = set()
+        self.cache_lookups = 0
+        self.cache_hits = 0
+        self.cache_reloads = 0
+
         self.init_db()
 
     def init_db(self):
         """Инициализация базы данных заблокированных пользователей"""
-        self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        self.pool = ConnectionManager(self.db_name, self.journal_mode, self.synchronous,
+                                      self.busy_timeout, self.read_pool_size)
+        self.conn = self.pool.write_conn
 
-        cursor = self.conn.cursor()
+        # Схема создается и обновляется миграциями по PRAGMA user_version
+        migrate(self.conn, self._migrations(), name=self.db_name)
+        self.reload_cache()
 
+    def _migrations(self) -> List[Migration]:
+        """Миграции базы заблокированных; новые шаги добавляются в конец со следующим номером"""
+        return [
+            Migration(1, "заблокированные пользователи", self._create_schema),
+            Migration(2, "индекс blocked_at для списка блокировок", self._add_blocked_at_index),
+        ]
+
+    def _create_schema(self, cursor):
+        """Исходная схема (версия 1)"""
         # Создаем таблицу заблокированных пользователей
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS blocked_users (
@@ -30,59 +56,109 @@ class BlockedDatabase:
             )
         ''')
 
-        self.conn.commit()
+    def _add_blocked_at_index(self, cursor):
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_blocked_at ON blocked_users (blocked_at)
+        ''')
+
+    def reload_cache(self):
+        """Загрузка всех заблокированных ID в память"""
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT user_id FROM blocked_users')
+            self.blocked_ids = {row[0] for row in cursor.fetchall()}
+        self.cache_reloads += 1
+        logging.info(f"Загружено заблокированных пользователей: {len(self.blocked_ids)}")
 
     def block_user(self, user_id: int, blocked_by: int, username: Optional[str] = None,
                    first_name: Optional[str] = None, last_name: Optional[str] = None,
                    reason: Optional[str] = None) -> bool:
         """Блокировка пользователя"""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                INSERT OR REPLACE INTO blocked_users 
-                (user_id, username, first_name, last_name, blocked_by, reason)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (user_id, username, first_name, last_name, blocked_by, reason))
-            self.conn.commit()
-            return True
-        except Exception as e:
-            logging.error(f"Ошибка при блокировке пользователя: {e}")
-            return False
+        with self.pool.writer() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR REPLACE INTO blocked_users 
+                    (user_id, username, first_name, last_name, blocked_by, reason)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (user_id, username, first_name, last_name, blocked_by, reason))
+                conn.commit()
+                self.blocked_ids.add(user_id)
+                return True
+            except Exception as e:
+                logging.error(f"Ошибка при блокировке пользователя: {e}")
+                return False
+
+    def bulk_block_users(self, rows: Iterable[tuple]) -> int:
+        """Массовая блокировка: кортежи (user_id, username, first_name, last_name, blocked_by, reason)"""
+        with self.pool.writer() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO blocked_users 
+                    (user_id, username, first_name, last_name, blocked_by, reason)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', rows)
+                count = cursor.rowcount
+                conn.commit()
+            except Exception as e:
+                logging.error(f"Ошибка при массовой блокировке пользователей: {e}")
+                conn.rollback()
+                raise
+        self.reload_cache()
+        return count
 
     def unblock_user(self, user_id: int) -> bool:
         """Разблокировка пользователя"""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('DELETE FROM blocked_users WHERE user_id = ?', (user_id,))
-            self.conn.commit()
-            return cursor.rowcount > 0
-        except Exception as e:
-            logging.error(f"Ошибка при разблокировке пользователя: {e}")
-            return False
+        with self.pool.writer() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute('DELETE FROM blocked_users WHERE user_id = ?', (user_id,))
+                conn.commit()
+                self.blocked_ids.discard(user_id)
+                return cursor.rowcount > 0
+            except Exception as e:
+                logging.error(f"Ошибка при разблокировке пользователя: {e}")
+                return False
 
     def is_user_blocked(self, user_id: int) -> bool:
-        """Проверка, заблокирован ли пользователь"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT user_id FROM blocked_users WHERE user_id = ?', (user_id,))
-        return cursor.fetchone() is not None
+        """Проверка, заблокирован ли пользователь (по индексу в памяти)"""
+        self.cache_lookups += 1
+        if user_id in self.blocked_ids:
+            self.cache_hits += 1
+            return True
+        return False
+
+    def get_cache_stats(self) -> Dict:
+        """Статистика индекса заблокированных пользователей"""
+        return {
+            'size': len(self.blocked_ids),
+            'lookups': self.cache_lookups,
+            'hits': self.cache_hits,
+            'reloads': self.cache_reloads
+        }
 
     def get_blocked_users(self) -> List[Dict]:
         """Получение списка всех заблокированных пользователей"""
-        cursor = self.conn.cursor()
-        cursor.execute('''
-            SELECT * FROM blocked_users 
-            ORDER BY blocked_at DESC
-        ''')
-        return [dict(row) for row in cursor.fetchall()]
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT * FROM blocked_users 
+                ORDER BY blocked_at DESC
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
 
     def get_blocked_user_info(self, user_id: int) -> Optional[Dict]:
         """Получение информации о блокировке пользователя"""
-        cursor = self.conn.cursor()
-        cursor.execute('SELECT * FROM blocked_users WHERE user_id = ?', (user_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT * FROM blocked_users WHERE user_id = ?', (user_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
 
     def close(self):
         """Закрытие соединения с базой данных"""
-        if self.conn:
-            self.conn.close()
\ No newline at end of file
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+            self.conn = None
\ No newline at end of file
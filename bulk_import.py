@@ -0,0 +1,165 @@
+import argparse
+import csv
+import gzip
+import json
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Iterator
+
+from database import Database, BULK_COLUMNS
+from blocked_database import BlockedDatabase
+from models import TicketStatus
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+FIRST_NAMES = ["Иван", "Анна", "Петр", "Мария", "Алексей", "Елена", "Сергей", "Ольга", "Дмитрий", "Наталья"]
+LAST_NAMES = ["Иванов", "Смирнова", "Кузнецов", "Попова", "Соколов", "Лебедева", "Козлов", "Новикова"]
+PROBLEMS = [
+    "Не включается компьютер", "Не работает принтер", "Нет доступа к сети", "Не открывается почта",
+    "Сломалась клавиатура", "Не работает проектор", "Медленно работает компьютер",
+    "Нужно установить программу", "Забыл пароль от учетной записи", "Не печатает сканер"
+]
+RESPONSES = ["Проблема устранена", "Заменено оборудование", "Переустановлено ПО", "Выполнена настройка"]
+FEEDBACKS = ["Спасибо!", "Быстро и качественно", "Долго ждал", "Все отлично", None]
+
+# Доли статусов и оценок в синтетических данных
+STATUS_WEIGHTS = {TicketStatus.CLOSED.value: 0.8, TicketStatus.IN_PROGRESS.value: 0.05, TicketStatus.OPEN.value: 0.15}
+RATING_WEIGHTS = [0.05, 0.05, 0.1, 0.3, 0.5]
+
+
+def open_text(path: str):
+    """Открытие файла на чтение, в том числе сжатого gzip"""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, "r", encoding="utf-8", newline="")
+
+
+def detect_format(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    return "jsonl" if name.endswith((".jsonl", ".json")) else "csv"
+
+
+def read_records(path: str, fmt: str) -> Iterator[Dict]:
+    """Потоковое чтение записей из CSV или JSONL"""
+    with open_text(path) as f:
+        if fmt == "csv":
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def to_row(record: Dict) -> tuple:
+    """Приведение записи к кортежу в порядке BULK_COLUMNS"""
+    values = {column: record.get(column) for column in BULK_COLUMNS}
+    # В CSV пустые ячейки приходят пустыми строками
+    for column, value in values.items():
+        if value == "":
+            values[column] = None
+
+    for column in ('user_id', 'full_name', 'room', 'problem'):
+        if values[column] is None:
+            raise ValueError(f"Не заполнено обязательное поле {column}: {record}")
+
+    values['status'] = TicketStatus(values['status'] or TicketStatus.OPEN.value).value
+    values['created_at'] = values['created_at'] or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for column in ('id', 'user_id', 'rating'):
+        if values[column] is not None:
+            values[column] = int(values[column])
+    return tuple(values[column] for column in BULK_COLUMNS)
+
+
+def import_file(db: Database, path: str, fmt: str, batch_size: int) -> int:
+    """Загрузка заявок из файла (формат как у выгрузки export.py)"""
+    rows = (to_row(record) for record in read_records(path, fmt))
+    return db.bulk_insert_tickets(rows, batch_size)
+
+
+def generate_tickets(count: int, users: int, days: int, rated: float, rng: random.Random) -> Iterator[tuple]:
+    """Синтетические заявки за последние days дней с равномерным распределением по времени"""
+    now = datetime.now()
+    start = now - timedelta(days=days)
+    step = (now - start) / max(count, 1)
+    statuses = list(STATUS_WEIGHTS)
+    status_weights = list(STATUS_WEIGHTS.values())
+
+    for i in range(count):
+        user_id = 100000 + rng.randrange(users)
+        created_at = start + step * i
+        status = rng.choices(statuses, status_weights)[0]
+        closed_by = closed_at = response = rating = feedback = None
+
+        if status == TicketStatus.CLOSED.value:
+            closed_at = min(created_at + timedelta(minutes=rng.randint(5, 72 * 60)), now)
+            closed_by = f"admin{rng.randint(1, 5)}"
+            response = rng.choice(RESPONSES)
+            if rng.random() < rated:
+                rating = rng.choices(range(1, 6), RATING_WEIGHTS)[0]
+                feedback = rng.choice(FEEDBACKS)
+
+        full_name = f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)}"
+        yield (
+            None, user_id, full_name, str(rng.randint(100, 450)), rng.choice(PROBLEMS), status,
+            created_at.strftime("%Y-%m-%d %H:%M:%S"), closed_by,
+            closed_at.strftime("%Y-%m-%d %H:%M:%S") if closed_at else None,
+            response, rating, feedback
+        )
+
+
+def generate_blocks(count: int, users: int, rng: random.Random) -> Iterator[tuple]:
+    """Синтетические блокировки среди сгенерированных пользователей"""
+    for user_id in rng.sample(range(100000, 100000 + users), min(count, users)):
+        yield (user_id, f"user{user_id}", rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), 1, "Спам")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Массовая загрузка заявок и генерация тестовых данных",
+        epilog="Останавливайте бота на время загрузки: она выполняется одной транзакцией, "
+               "и запись бота в базу заявок будет ждать ее окончания или завершится ошибкой."
+    )
+    parser.add_argument("--db", default="tickets.db", help="файл базы заявок")
+    parser.add_argument("--archive-db", default="tickets_archive.db",
+                        help="файл архива заявок, учитывается в пересчете счетчиков, если существует")
+    parser.add_argument("--batch-size", type=int, default=50000, help="строк в одной порции вставки")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="загрузка из CSV/JSONL (в том числе .gz)")
+    import_parser.add_argument("path", help="файл с заявками")
+    import_parser.add_argument("--format", choices=IMPORT_FORMATS, help="формат (по умолчанию по расширению)")
+
+    generate_parser = commands.add_parser("generate", help="генерация синтетических данных")
+    generate_parser.add_argument("--tickets", type=int, default=100000, help="количество заявок")
+    generate_parser.add_argument("--users", type=int, default=10000, help="количество пользователей")
+    generate_parser.add_argument("--days", type=int, default=365, help="период создания заявок в днях")
+    generate_parser.add_argument("--rated", type=float, default=0.6, help="доля оцененных закрытых заявок")
+    generate_parser.add_argument("--blocked", type=int, default=100, help="количество заблокированных")
+    generate_parser.add_argument("--blocked-db", default="blocked_users.db", help="файл базы блокировок")
+    generate_parser.add_argument("--seed", type=int, help="зерно генератора случайных чисел")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    archive_db = args.archive_db if args.archive_db and os.path.exists(args.archive_db) else None
+    db = Database(args.db, archive_db_name=archive_db)
+    try:
+        if args.command == "import":
+            import_file(db, args.path, args.format or detect_format(args.path), args.batch_size)
+        else:
+            rng = random.Random(args.seed)
+            db.bulk_insert_tickets(generate_tickets(args.tickets, args.users, args.days, args.rated, rng),
+                                   args.batch_size)
+            if args.blocked:
+                blocked_db = BlockedDatabase(args.blocked_db)
+                try:
+                    blocked_db.bulk_block_users(generate_blocks(args.blocked, args.users, rng))
+                finally:
+                    blocked_db.close()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -21,12 +21,94 @@ load_env()
 class Config:
     def __init__(self):
         self.BOT_TOKEN = os.getenv("BOT_TOKEN", "")
+        # Адрес сервера Bot API (пусто - api.telegram.org; для тестов - fake_bot_api.py)
+        self.BOT_API_URL = os.getenv("BOT_API_URL", "")
 
         admin_ids_str = os.getenv("ADMIN_IDS", "")
         self.ADMIN_IDS = [int(id_str.strip()) for id_str in admin_ids_str.split(",") if id_str.strip()]
 
         self.SUPPORT_CHAT_ID = int(os.getenv("SUPPORT_CHAT_ID", "0"))
         self.DB_NAME = os.getenv("DB_NAME", "tickets.db")
+        # База заблокированных пользователей; подключается к базе заявок для списков с признаком блокировки
+        self.BLOCKED_DB_NAME = os.getenv("BLOCKED_DB_NAME", "blocked_users.db")
+
+        # Настройки соединений SQLite
+        self.DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+        self.DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+        self.DB_BUSY_TIMEOUT = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))
+        self.DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+        # Групповая запись: окно сбора изменений в мс (0 - commit на каждое изменение) и размер группы.
+        # Полезна при DB_SYNCHRONOUS=FULL, когда каждый commit - отдельный fsync
+        self.DB_GROUP_COMMIT_MS = float(os.getenv("DB_GROUP_COMMIT_MS", "0"))
+        self.DB_GROUP_COMMIT_MAX_OPS = int(os.getenv("DB_GROUP_COMMIT_MAX_OPS", "100"))
+
+        # Архив закрытых заявок (пустое имя отключает архивацию)
+        self.ARCHIVE_DB_NAME = os.getenv("ARCHIVE_DB_NAME", "tickets_archive.db")
+        self.ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+        self.ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "3600"))
+        self.ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+
+        # Ограничение частоты запросов пользователей (запросов в секунду и запас)
+        self.THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "2"))
+        self.THROTTLE_BURST = float(os.getenv("THROTTLE_BURST", "10"))
+        # Лимиты по роутерам: "user=0.5/5,rating=1/3" (0 - без ограничения)
+        self.THROTTLE_ROUTER_LIMITS = os.getenv("THROTTLE_ROUTER_LIMITS", "user=0.5/5")
+        self.THROTTLE_BLOCKED_RATE = float(os.getenv("THROTTLE_BLOCKED_RATE", "0.1"))
+        # Автоблокировка: отклоненных запросов за окно в секундах
+        self.FLOOD_THRESHOLD = int(os.getenv("FLOOD_THRESHOLD", "30"))
+        self.FLOOD_WINDOW = float(os.getenv("FLOOD_WINDOW", "60"))
+        self.FLOOD_AUTO_BLOCK = os.getenv("FLOOD_AUTO_BLOCK", "false").lower() in ("1", "true", "yes")
+
+        # Профилирование запросов: лог медленных запросов с планом и команда /db_profile
+        self.DB_PROFILE = os.getenv("DB_PROFILE", "false").lower() in ("1", "true", "yes")
+        self.DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+        self.DB_PROFILE_TOP = int(os.getenv("DB_PROFILE_TOP", "10"))
+
+        # Кэш заявок в памяти (TICKET_CACHE_ENABLED=false - все чтения идут в базу, для отладки)
+        self.TICKET_CACHE_ENABLED = os.getenv("TICKET_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.TICKET_CACHE_SIZE = int(os.getenv("TICKET_CACHE_SIZE", "1000"))
+
+        # Количество заявок на одной странице списка
+        self.TICKETS_PAGE_SIZE = int(os.getenv("TICKETS_PAGE_SIZE", "10"))
+
+        # Лимиты исходящих сообщений (ограничения Bot API)
+        self.SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+        self.SEND_PRIVATE_RATE = float(os.getenv("SEND_PRIVATE_RATE", "1"))
+        self.SEND_GROUP_RATE_PER_MINUTE = float(os.getenv("SEND_GROUP_RATE_PER_MINUTE", "20"))
+        # Запас лимита группы для ответов обработчиков, идущих мимо очереди
+        self.SEND_GROUP_RESERVE = float(os.getenv("SEND_GROUP_RESERVE", "1"))
+        self.SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))
+
+        # Хранилище состояний FSM
+        self.FSM_DB_NAME = os.getenv("FSM_DB_NAME", "fsm.db")
+        self.FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+        self.FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "1.0"))
+        self.FSM_SESSION_TTL = int(os.getenv("FSM_SESSION_TTL", "86400"))
+
+        # Логирование: формат text или json, ротация по размеру (size) или времени (time)
+        self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+        self.LOG_FILE = os.getenv("LOG_FILE", "bot.log")
+        self.LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+        self.LOG_ROTATE = os.getenv("LOG_ROTATE", "size").lower()
+        self.LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+        self.LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+        self.LOG_ROTATE_WHEN = os.getenv("LOG_ROTATE_WHEN", "midnight")
+        # Уровни по модулям: "aiogram.event=WARNING,database=DEBUG"
+        self.LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+
+        # HTTP-эндпоинт /metrics в формате Prometheus (0 - отключен)
+        self.METRICS_HOST = os.getenv("METRICS_HOST", "0.0.0.0")
+        self.METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+        # Режим получения обновлений: polling или webhook
+        self.BOT_MODE = os.getenv("BOT_MODE", "polling").lower()
+        self.WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+        self.WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+        # Секретный токен webhook: обязателен, если бот сам регистрирует webhook (WEBHOOK_URL)
+        self.WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+        self.WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+        self.WEBAPP_PORT = int(os.getenv("WEBAPP_PORT", "8080"))
 
 
 def load_config() -> Config:
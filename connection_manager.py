@@ -0,0 +1,121 @@
+import sqlite3
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+
+class ConnectionManager:
+    """Менеджер соединений SQLite: одно соединение для записи и пул соединений только для чтения"""
+
+    def __init__(self, db_name: str, journal_mode: str = "WAL", synchronous: str = "NORMAL",
+                 busy_timeout: int = 5000, read_pool_size: int = 4,
+                 attachments: Optional[Dict[str, str]] = None,
+                 trace_callback: Optional[Callable[[str], None]] = None):
+        journal_mode = journal_mode.upper()
+        synchronous = synchronous.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Неизвестный режим журнала: {journal_mode}")
+        if synchronous not in SYNCHRONOUS_MODES:
+            raise ValueError(f"Неизвестный режим synchronous: {synchronous}")
+
+        self.db_name = db_name
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = int(busy_timeout)
+        # Дополнительные базы, подключаемые через ATTACH к каждому соединению: {псевдоним: файл}
+        self.attachments = attachments or {}
+        # Трассировка выполняемых операторов (профилирование запросов)
+        self.trace_callback = trace_callback
+
+        # База в памяти не видна другим соединениям - читаем через соединение записи
+        self.in_memory = db_name == ":memory:" or db_name.startswith("file::memory:")
+        self.read_pool_size = 0 if self.in_memory else max(int(read_pool_size), 0)
+
+        self._write_lock = threading.RLock()
+        self._readers = queue.Queue()
+        self._read_connections: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+        self.write_conn = self._connect()
+        self._apply_journal_mode()
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        """Создание соединения с общими настройками"""
+        if read_only:
+            conn = sqlite3.connect(f"file:{self.db_name}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn = sqlite3.connect(self.db_name, check_same_thread=False)
+
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+
+        for alias, path in self.attachments.items():
+            if read_only:
+                conn.execute(f"ATTACH DATABASE ? AS {alias}", (f"file:{path}?mode=ro",))
+            else:
+                conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+                conn.execute(f"PRAGMA {alias}.synchronous = {self.synchronous}")
+
+        if self.trace_callback:
+            conn.set_trace_callback(self.trace_callback)
+        return conn
+
+    def _apply_journal_mode(self):
+        """Включение режима журнала (WAL сохраняется в файле базы)"""
+        if self.in_memory:
+            return
+        for schema in ["main", *self.attachments]:
+            mode = self.write_conn.execute(f"PRAGMA {schema}.journal_mode = {self.journal_mode}").fetchone()[0]
+            if mode.upper() != self.journal_mode:
+                logging.warning(f"Режим журнала {self.journal_mode} недоступен для {schema}, используется {mode}")
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        """Получение соединения для чтения из пула (соединения создаются по требованию)"""
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._readers_lock:
+            if len(self._read_connections) < self.read_pool_size:
+                conn = self._connect(read_only=True)
+                self._read_connections.append(conn)
+                return conn
+
+        return self._readers.get()
+
+    @contextmanager
+    def writer(self):
+        """Эксклюзивный доступ к соединению записи"""
+        with self._write_lock:
+            yield self.write_conn
+
+    @contextmanager
+    def reader(self):
+        """Соединение только для чтения; не блокирует запись в режиме WAL"""
+        if not self.read_pool_size:
+            with self.writer() as conn:
+                yield conn
+            return
+
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    def close(self):
+        """Закрытие всех соединений"""
+        with self._readers_lock:
+            for conn in self._read_connections:
+                conn.close()
+            self._read_connections.clear()
+        with self._write_lock:
+            self.write_conn.close()
@@ -1,23 +1,147 @@
+import re
 import sqlite3
 import logging
-from datetime import datetime
-from typing import Optional, List, Dict
-from models import Ticket, TicketStatus
+from typing import Callable, Optional, List, Dict, Iterator, Iterable
+from models import Ticket, TicketStatus, TICKET_FIELDS
+from connection_manager import ConnectionManager
+from query_profiler import QueryProfiler
+from ticket_cache import TicketCache
+from migrations import Migration, migrate
+
+
+# Порядок столбцов для массовой загрузки заявок
+BULK_COLUMNS = TICKET_FIELDS
+
+# Явный список столбцов заявки: порядок столбцов main.tickets и archive.tickets может разойтись
+TICKET_COLUMNS = ', '.join(TICKET_FIELDS)
 
 
 class Database:
-    def __init__(self, db_name: str = "tickets.db"):
+    def __init__(self, db_name: str = "tickets.db", journal_mode: str = "WAL", synchronous: str = "NORMAL",
+                 busy_timeout: int = 5000, read_pool_size: int = 4, archive_db_name: Optional[str] = None,
+                 profile: bool = False, slow_query_ms: float = 100, ticket_cache_size: int = 1000,
+                 blocked_db_name: Optional[str] = None):
         self.db_name = db_name
+        # Архив закрытых заявок в отдельном файле, подключаемом через ATTACH
+        self.archive_db_name = archive_db_name
+        # База заблокированных пользователей (BlockedDatabase), подключаемая через ATTACH
+        # для признака блокировки в списках заявок
+        self.blocked_db_name = blocked_db_name
+        self.blocked_join_enabled = False
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.busy_timeout = busy_timeout
+        self.read_pool_size = read_pool_size
+        self.pool = None
         self.conn = None
+        self.search_enabled = False
+        self.archive_search_enabled = False
+
+        # Выполняется ли сейчас группа изменений с общим commit (run_batch)
+        self._in_batch = False
+        # Заявки, измененные внутри группы: попадают в кэш только после commit
+        self._batch_cache: List[Ticket] = []
+        self._batch_mark = 0
+
+        # LRU-кэш заявок по ID (0 отключает кэш)
+        self.ticket_cache = TicketCache(ticket_cache_size) if ticket_cache_size > 0 else None
+
+        # Профилирование запросов (трассировка операторов и время методов)
+        self.profiler = QueryProfiler(slow_query_ms, self._explain_query_plan) if profile else None
         self.init_db()
+        if self.profiler:
+            self._wrap_profiled_methods()
 
     def init_db(self):
         """Инициализация базы данных"""
-        self.conn = sqlite3.connect(self.db_name, check_same_thread=False)
-        self.conn.row_factory = sqlite3.Row
+        attachments = {}
+        if self.archive_db_name:
+            attachments['archive'] = self.archive_db_name
+        if self.blocked_db_name:
+            attachments['blocked'] = self.blocked_db_name
+        self.pool = ConnectionManager(self.db_name, self.journal_mode, self.synchronous,
+                                      self.busy_timeout, self.read_pool_size, attachments,
+                                      self.profiler.trace if self.profiler else None)
+        # Соединение записи; читающие запросы используют пул self.pool.reader()
+        self.conn = self.pool.write_conn
+
+        # Схема создается и обновляется миграциями по PRAGMA user_version.
+        # Архив - первым: пересчет счетчиков в миграциях базы заявок учитывает и его
+        if self.archive_db_name:
+            migrate(self.conn, self._archive_migrations(), schema='archive', name=self.archive_db_name)
+        migrate(self.conn, self._migrations(), name=self.db_name)
 
         cursor = self.conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tickets_fts'")
+        self.search_enabled = cursor.fetchone() is not None
+        if self.archive_db_name:
+            cursor.execute("SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'tickets_fts'")
+            self.archive_search_enabled = cursor.fetchone() is not None
+
+        if self.blocked_db_name:
+            # Схемой blocked_users владеет BlockedDatabase - она должна быть создана раньше
+            cursor.execute("SELECT 1 FROM blocked.sqlite_master WHERE type = 'table' AND name = 'blocked_users'")
+            self.blocked_join_enabled = cursor.fetchone() is not None
+            if not self.blocked_join_enabled:
+                logging.warning(f"В {self.blocked_db_name} нет таблицы blocked_users, "
+                                f"признак блокировки в списках заявок недоступен")
+        logging.info("База данных инициализирована")
+
+    def _tickets_union(self, where: str = '', params: Iterable = (), columns: str = TICKET_COLUMNS) -> tuple:
+        """Выборка заявок из main и архива (UNION ALL), если архив подключен
+
+        where и columns могут ссылаться на таблицу через псевдоним t; ORDER BY и LIMIT
+        добавляются к результату по именам столбцов. Возвращает (sql, params).
+        """
+        params = tuple(params)
+        sql = f'SELECT {columns} FROM main.tickets t {where}'
+        if not self.archive_db_name:
+            return sql, params
+        return f'{sql} UNION ALL SELECT {columns} FROM archive.tickets t {where}', params * 2
+
+    @property
+    def _blocked_column(self) -> str:
+        """Столбец user_blocked для запросов к tickets с псевдонимом t"""
+        if self.blocked_join_enabled:
+            return 'EXISTS (SELECT 1 FROM blocked.blocked_users b WHERE b.user_id = t.user_id) AS user_blocked'
+        return '0 AS user_blocked'
+
+    def _migrations(self) -> List[Migration]:
+        """Миграции базы заявок; новые шаги добавляются в конец со следующим номером"""
+        return [
+            Migration(1, "заявки, счетчики, сводка оценок, полнотекстовый индекс", self._create_schema),
+            Migration(2, "индекс (status, closed_at)", self._add_status_closed_at_index),
+            Migration(3, "индекс (user_id, created_at)", self._add_user_created_at_index),
+            Migration(4, "удаление индексов, перекрытых составными", self._drop_superseded_indexes),
+        ]
+
+    def _archive_migrations(self) -> List[Migration]:
+        """Миграции базы архива (своя версия схемы в подключенном файле)"""
+        return [
+            Migration(1, "архив закрытых заявок", self._init_archive),
+            Migration(2, "индексы архива для списков и выгрузки", self._add_archive_list_indexes),
+            Migration(3, "полнотекстовый индекс архива", self._init_archive_search),
+        ]
 
+    def _add_status_closed_at_index(self, cursor):
+        """Списки закрытых заявок: WHERE status = ? ORDER BY closed_at"""
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_status_closed_at ON tickets (status, closed_at)
+        ''')
+
+    def _add_user_created_at_index(self, cursor):
+        """Заявки пользователя: WHERE user_id = ? ORDER BY created_at, id (id входит в индекс как rowid)"""
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_user_created_at ON tickets (user_id, created_at)
+        ''')
+
+    def _drop_superseded_indexes(self, cursor):
+        """idx_user_id и idx_status - префиксы составных индексов и только замедляют запись"""
+        cursor.execute('DROP INDEX IF EXISTS idx_user_id')
+        cursor.execute('DROP INDEX IF EXISTS idx_status')
+
+    def _create_schema(self, cursor):
+        """Исходная схема базы заявок (версия 1)"""
         # Создаем таблицу заявок с колонками для оценок
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS tickets (
@@ -51,41 +175,465 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_created_at ON tickets (created_at)
         ''')
 
+        # Составной индекс для постраничного вывода заявок по статусу
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_status_created_at ON tickets (status, created_at)
+        ''')
+
         # Создаем индекс для оценок
         cursor.execute('''
             CREATE INDEX IF NOT EXISTS idx_rating ON tickets (rating)
         ''')
 
-        self.conn.commit()
-        logging.info("База данных инициализирована")
+        self._init_counters(cursor)
+        self._init_rating_summary(cursor)
+        self._init_search(cursor)
+
+    def _wrap_profiled_methods(self):
+        """Замер времени всех публичных методов с запросами, включая потоковые (iter_*)"""
+        for name in dir(type(self)):
+            if name.startswith('_') or name in ('init_db', 'close', 'get_query_stats', 'reset_query_stats',
+                                                  'get_cache_stats'):
+                continue
+            method = getattr(type(self), name)
+            if callable(method):
+                setattr(self, name, self.profiler.wrap(name, getattr(self, name)))
+
+    def _explain_query_plan(self, sql: str) -> List[str]:
+        """План выполнения запроса (EXPLAIN QUERY PLAN) в виде дерева строк"""
+        with self.pool.reader() as conn:
+            rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}').fetchall()
+        depth = {0: -1}
+        lines = []
+        for row in rows:
+            depth[row[0]] = depth.get(row[1], -1) + 1
+            lines.append('  ' * depth[row[0]] + row[3])
+        return lines
+
+    def get_query_stats(self, limit: int = 10, order_by: str = 'total') -> Optional[Dict]:
+        """Топ запросов и методов по времени выполнения (None, если профилирование выключено)"""
+        if not self.profiler:
+            return None
+        return self.profiler.get_top(limit, order_by)
+
+    def reset_query_stats(self):
+        """Сброс статистики профилирования"""
+        if self.profiler:
+            self.profiler.reset()
+
+    def get_cache_stats(self) -> Optional[Dict]:
+        """Статистика кэша заявок (None, если кэш выключен)"""
+        if not self.ticket_cache:
+            return None
+        return self.ticket_cache.get_stats()
+
+    def run_batch(self, calls: List[Callable[[], object]]) -> List[tuple]:
+        """Выполнение нескольких изменений в одной транзакции с одним commit (групповая запись)
+
+        Каждая операция выполняется в своей точке сохранения, ошибка откатывает только ее.
+        Возвращает [(True, результат) или (False, исключение)] в порядке calls.
+        """
+        results = []
+        with self.pool.writer() as conn:
+            if conn.in_transaction:
+                conn.commit()
+            # BEGIN IMMEDIATE заблокировал бы запись и в подключенные базы (архив, блокировки),
+            # первая же операция группы - изменение main
+            conn.execute('BEGIN')
+            self._in_batch = True
+            try:
+                for call in calls:
+                    conn.execute('SAVEPOINT group_op')
+                    self._batch_mark = len(self._batch_cache)
+                    try:
+                        results.append((True, call()))
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO group_op')
+                        del self._batch_cache[self._batch_mark:]
+                        results.append((False, e))
+                    conn.execute('RELEASE group_op')
+                conn.commit()
+            except Exception as e:
+                logging.error(f"Ошибка групповой записи ({len(calls)} операций): {e}")
+                conn.rollback()
+                raise
+            finally:
+                self._in_batch = False
+                batch_cache, self._batch_cache = self._batch_cache, []
+
+        # Кэш обновляется только после успешного commit группы
+        if self.ticket_cache:
+            for ticket in batch_cache:
+                self.ticket_cache.put(ticket)
+        return results
+
+    def _commit(self, conn: sqlite3.Connection):
+        """Commit изменения; внутри run_batch фиксация выполняется один раз для всей группы"""
+        if not self._in_batch:
+            conn.commit()
+
+    def _rollback(self, conn: sqlite3.Connection):
+        """Откат изменения; внутри run_batch откатывается только текущая операция"""
+        if self._in_batch:
+            conn.execute('ROLLBACK TO group_op')
+            del self._batch_cache[self._batch_mark:]
+        else:
+            conn.rollback()
+
+    def _cache_ticket(self, row) -> Optional[Ticket]:
+        """Заявка из строки, возвращенной изменением (RETURNING), с записью в кэш"""
+        if row is None:
+            return None
+        ticket = self._row_to_ticket(row)
+        if self._in_batch:
+            self._batch_cache.append(ticket)
+        elif self.ticket_cache:
+            self.ticket_cache.put(ticket)
+        return ticket
+
+    def _init_counters(self, cursor):
+        """Счетчики заявок по статусам и по дням, обновляемые триггерами"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ticket_counters (
+                status TEXT PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ticket_daily_stats (
+                day TEXT PRIMARY KEY,
+                created INTEGER NOT NULL DEFAULT 0,
+                closed INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        # Новая заявка: счетчик статуса и счетчик за день создания
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_tickets_counters_insert AFTER INSERT ON tickets
+            BEGIN
+                INSERT INTO ticket_counters (status, count) VALUES (NEW.status, 1)
+                    ON CONFLICT(status) DO UPDATE SET count = count + 1;
+                INSERT INTO ticket_daily_stats (day, created) VALUES (DATE(NEW.created_at), 1)
+                    ON CONFLICT(day) DO UPDATE SET created = created + 1;
+                INSERT INTO ticket_daily_stats (day, closed)
+                    SELECT DATE(NEW.closed_at), 1 WHERE NEW.status = 'closed' AND NEW.closed_at IS NOT NULL
+                    ON CONFLICT(day) DO UPDATE SET closed = closed + 1;
+            END
+        ''')
+
+        # Смена статуса: перенос между счетчиками и счетчик закрытых за день
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_tickets_counters_status AFTER UPDATE OF status ON tickets
+            WHEN OLD.status <> NEW.status
+            BEGIN
+                UPDATE ticket_counters SET count = count - 1 WHERE status = OLD.status;
+                INSERT INTO ticket_counters (status, count) VALUES (NEW.status, 1)
+                    ON CONFLICT(status) DO UPDATE SET count = count + 1;
+                INSERT INTO ticket_daily_stats (day, closed)
+                    SELECT DATE(NEW.closed_at), 1 WHERE NEW.status = 'closed' AND NEW.closed_at IS NOT NULL
+                    ON CONFLICT(day) DO UPDATE SET closed = closed + 1;
+            END
+        ''')
+
+        # Счетчики учитывают все когда-либо созданные заявки, поэтому триггера на DELETE нет
+
+        # Первичное заполнение счетчиков по существующим заявкам
+        cursor.execute('SELECT COUNT(*) FROM ticket_counters')
+        if cursor.fetchone()[0] == 0:
+            self._rebuild_counters(cursor)
+
+    def _rebuild_counters(self, cursor):
+        """Пересчет счетчиков по таблице заявок и архиву (счетчики учитывают все заявки)"""
+        cursor.execute('DELETE FROM ticket_counters')
+        cursor.execute('DELETE FROM ticket_daily_stats')
+
+        cursor.executemany('INSERT INTO ticket_counters (status, count) VALUES (?, 0)',
+                           [(status.value,) for status in TicketStatus])
+        tickets, params = self._tickets_union(columns='status, created_at, closed_at')
+        cursor.execute(f'''
+            INSERT INTO ticket_counters (status, count)
+            SELECT status, COUNT(*) FROM ({tickets}) GROUP BY status
+            ON CONFLICT(status) DO UPDATE SET count = excluded.count
+        ''', params)
+
+        cursor.execute(f'''
+            INSERT INTO ticket_daily_stats (day, created)
+            SELECT DATE(created_at), COUNT(*) FROM ({tickets}) GROUP BY DATE(created_at)
+        ''', params)
+        cursor.execute(f'''
+            INSERT INTO ticket_daily_stats (day, closed)
+            SELECT DATE(closed_at), COUNT(*) FROM ({tickets}) 
+            WHERE status = 'closed' AND closed_at IS NOT NULL 
+            GROUP BY DATE(closed_at)
+            ON CONFLICT(day) DO UPDATE SET closed = excluded.closed
+        ''', params)
+        logging.info("Счетчики заявок пересчитаны")
 
     def add_ticket(self, user_id: int, full_name: str, room: str, problem: str) -> int:
         """Добавление новой заявки"""
+        with self.pool.writer() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO tickets (user_id, full_name, room, problem, status)
+                    VALUES (?, ?, ?, ?, ?)
+                    RETURNING *
+                ''', (user_id, full_name, room, problem, TicketStatus.OPEN.value))
+                row = cursor.fetchone()
+                self._commit(conn)
+                ticket_id = self._cache_ticket(row).id
+                logging.info(f"Добавлена новая заявка #{ticket_id} от пользователя {user_id}")
+                return ticket_id
+            except Exception as e:
+                logging.error(f"Ошибка при добавлении заявки: {e}")
+                self._rollback(conn)
+                raise
+
+    def _init_rating_summary(self, cursor):
+        """Сводка оценок (количество по каждой оценке), обновляемая триггерами"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS rating_counters (
+                rating INTEGER PRIMARY KEY,
+                count INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+
+        # Частичный индекс для последних оценённых заявок
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_rated_closed_at ON tickets (closed_at) WHERE rating IS NOT NULL
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_tickets_rating_insert AFTER INSERT ON tickets
+            WHEN NEW.rating IS NOT NULL
+            BEGIN
+                INSERT INTO rating_counters (rating, count) VALUES (NEW.rating, 1)
+                    ON CONFLICT(rating) DO UPDATE SET count = count + 1;
+            END
+        ''')
+
+        # Повторная оценка переносит заявку из старой оценки в новую
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_tickets_rating_update AFTER UPDATE OF rating ON tickets
+            WHEN OLD.rating IS NOT NEW.rating
+            BEGIN
+                UPDATE rating_counters SET count = count - 1 WHERE rating = OLD.rating;
+                INSERT INTO rating_counters (rating, count)
+                    SELECT NEW.rating, 1 WHERE NEW.rating IS NOT NULL
+                    ON CONFLICT(rating) DO UPDATE SET count = count + 1;
+            END
+        ''')
+
+        cursor.execute('SELECT COUNT(*) FROM rating_counters')
+        if cursor.fetchone()[0] == 0:
+            self._rebuild_rating_summary(cursor)
+
+    def _rebuild_rating_summary(self, cursor):
+        """Пересчет сводки оценок по таблице заявок и архиву"""
+        cursor.execute('DELETE FROM rating_counters')
+        cursor.executemany('INSERT INTO rating_counters (rating, count) VALUES (?, 0)',
+                           [(rating,) for rating in range(1, 6)])
+        tickets, params = self._tickets_union('WHERE rating IS NOT NULL', columns='rating')
+        cursor.execute(f'''
+            INSERT INTO rating_counters (rating, count)
+            SELECT rating, COUNT(*) FROM ({tickets}) GROUP BY rating
+            ON CONFLICT(rating) DO UPDATE SET count = excluded.count
+        ''', params)
+
+    def _init_search(self, cursor):
+        """Полнотекстовый индекс FTS5 по заявкам, синхронизируемый триггерами"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'tickets_fts'")
+        exists = cursor.fetchone() is not None
+
         try:
-            cursor = self.conn.cursor()
             cursor.execute('''
-                INSERT INTO tickets (user_id, full_name, room, problem, status)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, full_name, room, problem, TicketStatus.OPEN.value))
-            self.conn.commit()
-            ticket_id = cursor.lastrowid
-            logging.info(f"Добавлена новая заявка #{ticket_id} от пользователя {user_id}")
-            return ticket_id
-        except Exception as e:
-            logging.error(f"Ошибка при добавлении заявки: {e}")
-            self.conn.rollback()
-            raise
+                CREATE VIRTUAL TABLE IF NOT EXISTS tickets_fts USING fts5(
+                    problem, admin_response, feedback, full_name, room,
+                    content='tickets', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Поиск по заявкам недоступен (нет FTS5): {e}")
+            return
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_insert AFTER INSERT ON tickets
+            BEGIN
+                INSERT INTO tickets_fts (rowid, problem, admin_response, feedback, full_name, room)
+                VALUES (NEW.id, NEW.problem, NEW.admin_response, NEW.feedback, NEW.full_name, NEW.room);
+            END
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_delete AFTER DELETE ON tickets
+            BEGIN
+                INSERT INTO tickets_fts (tickets_fts, rowid, problem, admin_response, feedback, full_name, room)
+                VALUES ('delete', OLD.id, OLD.problem, OLD.admin_response, OLD.feedback, OLD.full_name, OLD.room);
+            END
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_tickets_fts_update
+            AFTER UPDATE OF problem, admin_response, feedback, full_name, room ON tickets
+            BEGIN
+                INSERT INTO tickets_fts (tickets_fts, rowid, problem, admin_response, feedback, full_name, room)
+                VALUES ('delete', OLD.id, OLD.problem, OLD.admin_response, OLD.feedback, OLD.full_name, OLD.room);
+                INSERT INTO tickets_fts (rowid, problem, admin_response, feedback, full_name, room)
+                VALUES (NEW.id, NEW.problem, NEW.admin_response, NEW.feedback, NEW.full_name, NEW.room);
+            END
+        ''')
+
+        if not exists:
+            # Веса столбцов для ранжирования: ФИО и кабинет важнее ответа и отзыва
+            cursor.execute("INSERT INTO tickets_fts (tickets_fts, rank) VALUES ('rank', 'bm25(1.0, 0.5, 0.5, 2.0, 2.0)')")
+            cursor.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
+            logging.info("Полнотекстовый индекс заявок построен")
+
+    def _init_archive(self, cursor):
+        """Таблица архива закрытых заявок в подключенной базе archive"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS archive.tickets (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                full_name TEXT NOT NULL,
+                room TEXT NOT NULL,
+                problem TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at TIMESTAMP,
+                closed_by TEXT,
+                closed_at TIMESTAMP,
+                admin_response TEXT,
+                rating INTEGER,
+                feedback TEXT
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS archive.idx_archive_user_id ON tickets (user_id, created_at)
+        ''')
+
+    def _add_archive_list_indexes(self, cursor):
+        """Индексы архива под те же сортировки, что и в main: каждая ветка UNION ALL
+        читается по индексу, а не полным сканированием с сортировкой"""
+        # Последние оценки: WHERE rating IS NOT NULL ORDER BY closed_at
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS archive.idx_archive_rated_closed_at ON tickets (closed_at, id)
+            WHERE rating IS NOT NULL
+        ''')
+        # Закрытые заявки: WHERE status = ? ORDER BY closed_at
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS archive.idx_archive_status_closed_at ON tickets (status, closed_at, id)
+        ''')
+        # Выгрузка: ORDER BY created_at, id с фильтром по датам
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS archive.idx_archive_created_at ON tickets (created_at, id)
+        ''')
+        # Выгрузка с фильтром по статусу: WHERE status = ? ORDER BY created_at, id
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS archive.idx_archive_status_created_at ON tickets (status, created_at, id)
+        ''')
+
+    def _init_archive_search(self, cursor):
+        """Полнотекстовый индекс архива: перенесенные заявки остаются доступны поиску"""
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS archive.tickets_fts USING fts5(
+                    problem, admin_response, feedback, full_name, room,
+                    content='tickets', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Поиск по архиву недоступен (нет FTS5): {e}")
+            return
+
+        # Архив меняется только переносом (INSERT) и его повтором после сбоя (DELETE + INSERT)
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS archive.trg_archive_fts_insert AFTER INSERT ON tickets
+            BEGIN
+                INSERT INTO tickets_fts (rowid, problem, admin_response, feedback, full_name, room)
+                VALUES (NEW.id, NEW.problem, NEW.admin_response, NEW.feedback, NEW.full_name, NEW.room);
+            END
+        ''')
+
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS archive.trg_archive_fts_delete AFTER DELETE ON tickets
+            BEGIN
+                INSERT INTO tickets_fts (tickets_fts, rowid, problem, admin_response, feedback, full_name, room)
+                VALUES ('delete', OLD.id, OLD.problem, OLD.admin_response, OLD.feedback, OLD.full_name, OLD.room);
+            END
+        ''')
+
+        cursor.execute("INSERT INTO archive.tickets_fts (tickets_fts, rank) VALUES ('rank', 'bm25(1.0, 0.5, 0.5, 2.0, 2.0)')")
+        cursor.execute("INSERT INTO archive.tickets_fts (tickets_fts) VALUES ('rebuild')")
+        logging.info("Полнотекстовый индекс архива построен")
+
+    def archive_closed_tickets(self, older_than_days: int, batch_size: int = 1000) -> int:
+        """Перенос одной порции давно закрытых заявок в архив; возвращает количество перенесенных
+
+        Счетчики статистики и оценок при переносе не уменьшаются (триггеров на DELETE нет),
+        полнотекстовый поиск находит заявки по индексу архива.
+        """
+        if not self.archive_db_name:
+            return 0
+
+        with self.pool.writer() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id FROM main.tickets 
+                    WHERE status = ? AND closed_at < DATETIME('now', ?) 
+                    LIMIT ?
+                ''', (TicketStatus.CLOSED.value, f"-{int(older_than_days)} days", batch_size))
+                ids = [row[0] for row in cursor.fetchall()]
+                if not ids:
+                    return 0
+
+                placeholders = ','.join('?' * len(ids))
+                # Повторный перенос после сбоя не создает дублей. Не INSERT OR REPLACE: при замене
+                # триггер DELETE не срабатывает и в индексе архива остались бы старые записи
+                cursor.execute(f'DELETE FROM archive.tickets WHERE id IN ({placeholders})', ids)
+                cursor.execute(f'''
+                    INSERT INTO archive.tickets ({TICKET_COLUMNS}) 
+                    SELECT {TICKET_COLUMNS} FROM main.tickets WHERE id IN ({placeholders})
+                ''', ids)
+                cursor.execute(f'DELETE FROM main.tickets WHERE id IN ({placeholders})', ids)
+                conn.commit()
+            except Exception as e:
+                logging.error(f"Ошибка при архивации заявок: {e}")
+                conn.rollback()
+                raise
+
+        logging.info(f"Перенесено в архив заявок: {len(ids)}")
+        return len(ids)
 
     def get_ticket(self, ticket_id: int) -> Optional[Ticket]:
-        """Получение заявки по ID"""
+        """Получение заявки по ID (включая архив), сначала из кэша"""
+        generation = 0
+        if self.ticket_cache:
+            ticket = self.ticket_cache.get(ticket_id)
+            if ticket is not None:
+                return ticket
+            generation = self.ticket_cache.generation
+
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM tickets WHERE id = ?', (ticket_id,))
-            row = cursor.fetchone()
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM main.tickets WHERE id = ?', (ticket_id,))
+                row = cursor.fetchone()
 
-            if row:
-                return self._row_to_ticket(row)
-            return None
+                if not row and self.archive_db_name:
+                    cursor.execute('SELECT * FROM archive.tickets WHERE id = ?', (ticket_id,))
+                    row = cursor.fetchone()
+
+                if not row:
+                    return None
+                ticket = self._row_to_ticket(row)
+                if self.ticket_cache:
+                    self.ticket_cache.put_loaded(ticket, generation)
+                return ticket
         except Exception as e:
             logging.error(f"Ошибка при получении заявки #{ticket_id}: {e}")
             return None
@@ -93,174 +641,459 @@ class Database:
     def update_ticket_status(self, ticket_id: int, status: TicketStatus,
                              closed_by: Optional[str] = None, response: Optional[str] = None):
         """Обновление статуса заявки"""
-        try:
-            cursor = self.conn.cursor()
+        with self.pool.writer() as conn:
+            try:
+                cursor = conn.cursor()
 
-            if status == TicketStatus.CLOSED:
-                cursor.execute('''
-                    UPDATE tickets 
-                    SET status = ?, closed_by = ?, closed_at = CURRENT_TIMESTAMP, admin_response = ?
-                    WHERE id = ?
-                ''', (status.value, closed_by, response, ticket_id))
-            else:
-                cursor.execute('''
-                    UPDATE tickets 
-                    SET status = ?, admin_response = ?
-                    WHERE id = ?
-                ''', (status.value, response, ticket_id))
+                if status == TicketStatus.CLOSED:
+                    cursor.execute('''
+                        UPDATE tickets 
+                        SET status = ?, closed_by = ?, closed_at = CURRENT_TIMESTAMP, admin_response = ?
+                        WHERE id = ?
+                        RETURNING *
+                    ''', (status.value, closed_by, response, ticket_id))
+                else:
+                    cursor.execute('''
+                        UPDATE tickets 
+                        SET status = ?, admin_response = ?
+                        WHERE id = ?
+                        RETURNING *
+                    ''', (status.value, response, ticket_id))
 
-            self.conn.commit()
-            logging.info(f"Заявка #{ticket_id} обновлена: статус {status.value}")
-        except Exception as e:
-            logging.error(f"Ошибка при обновлении заявки #{ticket_id}: {e}")
-            self.conn.rollback()
-            raise
+                row = cursor.fetchone()
+                self._commit(conn)
+                self._cache_ticket(row)
+                logging.info(f"Заявка #{ticket_id} обновлена: статус {status.value}")
+            except Exception as e:
+                logging.error(f"Ошибка при обновлении заявки #{ticket_id}: {e}")
+                self._rollback(conn)
+                raise
+
+    def transition_ticket(self, ticket_id: int, expected: TicketStatus, status: TicketStatus,
+                          closed_by: Optional[str] = None, response: Optional[str] = None) -> Optional[Ticket]:
+        """Смена статуса заявки, если ее текущий статус равен ожидаемому
+
+        Возвращает обновленную заявку одним запросом (UPDATE ... RETURNING) или None,
+        если заявка не найдена или ее статус уже изменил другой администратор.
+        """
+        with self.pool.writer() as conn:
+            try:
+                cursor = conn.cursor()
+
+                if status == TicketStatus.CLOSED:
+                    cursor.execute('''
+                        UPDATE tickets 
+                        SET status = ?, closed_by = ?, closed_at = CURRENT_TIMESTAMP, admin_response = ?
+                        WHERE id = ? AND status = ?
+                        RETURNING *
+                    ''', (status.value, closed_by, response, ticket_id, expected.value))
+                else:
+                    cursor.execute('''
+                        UPDATE tickets 
+                        SET status = ?, admin_response = ?
+                        WHERE id = ? AND status = ?
+                        RETURNING *
+                    ''', (status.value, response, ticket_id, expected.value))
+
+                row = cursor.fetchone()
+                self._commit(conn)
+                ticket = self._cache_ticket(row)
+            except Exception as e:
+                logging.error(f"Ошибка при смене статуса заявки #{ticket_id}: {e}")
+                self._rollback(conn)
+                raise
+
+        if ticket is None:
+            # Статус в кэше мог разойтись с базой - следующее чтение пойдет в базу
+            if self.ticket_cache:
+                self.ticket_cache.invalidate(ticket_id)
+            logging.info(f"Заявка #{ticket_id} не переведена в {status.value}: текущий статус не {expected.value}")
+            return None
+
+        logging.info(f"Заявка #{ticket_id} обновлена: статус {expected.value} -> {status.value}")
+        return ticket
+
+    def take_ticket_to_work(self, ticket_id: int) -> Optional[Ticket]:
+        """Перевод открытой заявки в работу; None, если заявка уже не открыта"""
+        return self.transition_ticket(ticket_id, TicketStatus.OPEN, TicketStatus.IN_PROGRESS)
+
+    def close_ticket(self, ticket_id: int, closed_by: str, response: Optional[str] = None) -> Optional[Ticket]:
+        """Закрытие заявки в работе; None, если заявка уже не в работе"""
+        return self.transition_ticket(ticket_id, TicketStatus.IN_PROGRESS, TicketStatus.CLOSED,
+                                      closed_by=closed_by, response=response)
 
     def update_ticket_rating(self, ticket_id: int, rating: int, feedback: Optional[str] = None):
         """Обновление оценки заявки"""
-        try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                UPDATE tickets 
-                SET rating = ?, feedback = ?
-                WHERE id = ?
-            ''', (rating, feedback, ticket_id))
-
-            self.conn.commit()
-            logging.info(f"Заявка #{ticket_id} оценена на {rating} звезд")
-            return True
-        except Exception as e:
-            logging.error(f"Ошибка при обновлении оценки заявки #{ticket_id}: {e}")
-            self.conn.rollback()
-            return False
+        with self.pool.writer() as conn:
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE tickets 
+                    SET rating = ?, feedback = ?
+                    WHERE id = ?
+                    RETURNING *
+                ''', (rating, feedback, ticket_id))
 
-    def get_open_tickets(self) -> List[Dict]:
+                row = cursor.fetchone()
+                self._commit(conn)
+                if row is None:
+                    # Заявки нет в основной таблице (например, уже перенесена в архив)
+                    logging.warning(f"Оценка не сохранена: заявка #{ticket_id} не найдена среди активных")
+                    return False
+                self._cache_ticket(row)
+                logging.info(f"Заявка #{ticket_id} оценена на {rating} звезд")
+                return True
+            except Exception as e:
+                logging.error(f"Ошибка при обновлении оценки заявки #{ticket_id}: {e}")
+                self._rollback(conn)
+                return False
+
+    def get_open_tickets(self) -> List[sqlite3.Row]:
         """Получение всех открытых заявок (статус OPEN)"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                SELECT * FROM tickets 
-                WHERE status = ? 
-                ORDER BY created_at DESC
-            ''', (TicketStatus.OPEN.value,))
-            return [dict(row) for row in cursor.fetchall()]
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT * FROM tickets 
+                    WHERE status = ? 
+                    ORDER BY created_at DESC
+                ''', (TicketStatus.OPEN.value,))
+                return cursor.fetchall()
         except Exception as e:
             logging.error(f"Ошибка при получении открытых заявок: {e}")
             return []
 
-    def get_in_progress_tickets(self) -> List[Dict]:
+    def get_in_progress_tickets(self) -> List[sqlite3.Row]:
         """Получение всех заявок в работе (статус IN_PROGRESS)"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                SELECT * FROM tickets 
-                WHERE status = ? 
-                ORDER BY created_at DESC
-            ''', (TicketStatus.IN_PROGRESS.value,))
-            return [dict(row) for row in cursor.fetchall()]
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT * FROM tickets 
+                    WHERE status = ? 
+                    ORDER BY created_at DESC
+                ''', (TicketStatus.IN_PROGRESS.value,))
+                return cursor.fetchall()
         except Exception as e:
             logging.error(f"Ошибка при получении заявок в работе: {e}")
             return []
 
-    def get_closed_tickets(self) -> List[Dict]:
-        """Получение всех закрытых заявок (статус CLOSED)"""
+    def get_tickets_page(self, status: TicketStatus, page_size: int = 10,
+                         after_id: Optional[int] = None, before_id: Optional[int] = None) -> Dict:
+        """Страница заявок по статусу (keyset-пагинация по created_at, id)
+
+        after_id - следующая страница после заявки, before_id - предыдущая страница перед заявкой.
+        """
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                SELECT * FROM tickets 
-                WHERE status = ? 
-                ORDER BY closed_at DESC
-            ''', (TicketStatus.CLOSED.value,))
-            return [dict(row) for row in cursor.fetchall()]
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+
+                if before_id is not None:
+                    cursor.execute(f'''
+                        SELECT t.*, {self._blocked_column} FROM tickets t 
+                        WHERE status = ? 
+                          AND (created_at, id) > (SELECT created_at, id FROM tickets WHERE id = ?)
+                        ORDER BY created_at ASC, id ASC 
+                        LIMIT ?
+                    ''', (status.value, before_id, page_size + 1))
+                    rows = cursor.fetchall()
+                    has_prev = len(rows) > page_size
+                    tickets = list(reversed(rows[:page_size]))
+                    return {'tickets': tickets, 'has_prev': has_prev, 'has_next': True}
+
+                if after_id is not None:
+                    cursor.execute(f'''
+                        SELECT t.*, {self._blocked_column} FROM tickets t 
+                        WHERE status = ? 
+                          AND (created_at, id) < (SELECT created_at, id FROM tickets WHERE id = ?)
+                        ORDER BY created_at DESC, id DESC 
+                        LIMIT ?
+                    ''', (status.value, after_id, page_size + 1))
+                else:
+                    cursor.execute(f'''
+                        SELECT t.*, {self._blocked_column} FROM tickets t 
+                        WHERE status = ? 
+                        ORDER BY created_at DESC, id DESC 
+                        LIMIT ?
+                    ''', (status.value, page_size + 1))
+
+                rows = cursor.fetchall()
+                return {
+                    'tickets': rows[:page_size],
+                    'has_prev': after_id is not None,
+                    'has_next': len(rows) > page_size
+                }
+        except Exception as e:
+            logging.error(f"Ошибка при получении страницы заявок ({status.value}): {e}")
+            return {'tickets': [], 'has_prev': False, 'has_next': False}
+
+    def count_tickets(self, status: TicketStatus) -> int:
+        """Количество заявок с указанным статусом"""
+        try:
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT count FROM ticket_counters WHERE status = ?', (status.value,))
+                row = cursor.fetchone()
+                return row[0] if row else 0
+        except Exception as e:
+            logging.error(f"Ошибка при подсчете заявок ({status.value}): {e}")
+            return 0
+
+    def get_closed_tickets(self) -> List[sqlite3.Row]:
+        """Получение всех закрытых заявок (статус CLOSED), включая архив"""
+        try:
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                sql, params = self._tickets_union('WHERE status = ?', (TicketStatus.CLOSED.value,))
+                cursor.execute(f'{sql} ORDER BY closed_at DESC', params)
+                return cursor.fetchall()
         except Exception as e:
             logging.error(f"Ошибка при получении закрытых заявок: {e}")
             return []
 
-    def get_user_tickets(self, user_id: int) -> List[Dict]:
-        """Получение заявок пользователя"""
+    def get_user_tickets(self, user_id: int) -> List[sqlite3.Row]:
+        """Получение заявок пользователя (включая архив)"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                SELECT * FROM tickets 
-                WHERE user_id = ? 
-                ORDER BY created_at DESC
-            ''', (user_id,))
-            return [dict(row) for row in cursor.fetchall()]
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                sql, params = self._tickets_union('WHERE user_id = ?', (user_id,))
+                cursor.execute(f'{sql} ORDER BY created_at DESC', params)
+                return cursor.fetchall()
         except Exception as e:
             logging.error(f"Ошибка при получении заявок пользователя {user_id}: {e}")
             return []
 
-    def get_rated_tickets(self, limit: int = 10) -> List[Dict]:
-        """Получение заявок с оценками"""
+    def get_rated_tickets(self, limit: int = 10) -> List[sqlite3.Row]:
+        """Получение последних заявок с оценками (включая архив)"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                SELECT * FROM tickets 
-                WHERE rating IS NOT NULL 
-                ORDER BY closed_at DESC 
-                LIMIT ?
-            ''', (limit,))
-            return [dict(row) for row in cursor.fetchall()]
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                sql, params = self._tickets_union('WHERE rating IS NOT NULL',
+                                                  columns=f'{TICKET_COLUMNS}, {self._blocked_column}')
+                cursor.execute(f'{sql} ORDER BY closed_at DESC LIMIT ?', (*params, limit))
+                return cursor.fetchall()
         except Exception as e:
             logging.error(f"Ошибка при получении заявок с оценками: {e}")
             return []
 
+    def _search_arm(self, schema: str) -> str:
+        """Поиск по FTS-индексу схемы (main или archive) с присоединением заявок"""
+        return f'''
+            SELECT t.*, f.rank, f.snippet, {self._blocked_column} FROM (
+                SELECT rowid, rank, snippet(tickets_fts, -1, '«', '»', '…', 12) AS snippet
+                FROM {schema}.tickets_fts 
+                WHERE tickets_fts MATCH ? 
+                ORDER BY rank 
+                LIMIT ?
+            ) AS f
+            JOIN {schema}.tickets t ON t.id = f.rowid
+        '''
+
+    def search_tickets(self, text: str, limit: int = 10, offset: int = 0) -> Dict:
+        """Полнотекстовый поиск заявок с ранжированием (bm25), включая архив"""
+        # Каждое слово запроса ищется по префиксу, все слова должны встретиться
+        words = re.findall(r'\w+', text)
+        if not self.search_enabled or not words:
+            return {'tickets': [], 'has_next': False}
+        match = ' '.join(f'"{word}"*' for word in words)
+
+        try:
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                # Каждая ветка отдает не больше offset + limit + 1 лучших, общий порядок - по rank
+                schemas = ['main', 'archive'] if self.archive_search_enabled else ['main']
+                arms = ' UNION ALL '.join(self._search_arm(schema) for schema in schemas)
+                cursor.execute(
+                    f'SELECT * FROM ({arms}) ORDER BY rank LIMIT ? OFFSET ?',
+                    (*(match, offset + limit + 1) * len(schemas), limit + 1, offset)
+                )
+                rows = cursor.fetchall()
+                return {'tickets': rows[:limit], 'has_next': len(rows) > limit}
+        except Exception as e:
+            logging.error(f"Ошибка при поиске заявок: {e}")
+            return {'tickets': [], 'has_next': False}
+
     def get_rating_stats(self) -> Dict:
         """Получение статистики оценок"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''
-                SELECT 
-                    AVG(rating) as avg_rating,
-                    COUNT(*) as total_ratings,
-                    COUNT(CASE WHEN rating = 5 THEN 1 END) as five_stars,
-                    COUNT(CASE WHEN rating = 4 THEN 1 END) as four_stars,
-                    COUNT(CASE WHEN rating = 3 THEN 1 END) as three_stars,
-                    COUNT(CASE WHEN rating = 2 THEN 1 END) as two_stars,
-                    COUNT(CASE WHEN rating = 1 THEN 1 END) as one_stars
-                FROM tickets 
-                WHERE rating IS NOT NULL
-            ''')
-            result = cursor.fetchone()
-            return dict(result) if result else {}
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT 
+                        SUM(rating * count) * 1.0 / NULLIF(SUM(count), 0) as avg_rating,
+                        COALESCE(SUM(count), 0) as total_ratings,
+                        COALESCE(SUM(CASE WHEN rating = 5 THEN count END), 0) as five_stars,
+                        COALESCE(SUM(CASE WHEN rating = 4 THEN count END), 0) as four_stars,
+                        COALESCE(SUM(CASE WHEN rating = 3 THEN count END), 0) as three_stars,
+                        COALESCE(SUM(CASE WHEN rating = 2 THEN count END), 0) as two_stars,
+                        COALESCE(SUM(CASE WHEN rating = 1 THEN count END), 0) as one_stars
+                    FROM rating_counters
+                ''')
+                result = cursor.fetchone()
+                return dict(result) if result else {}
         except Exception as e:
             logging.error(f"Ошибка при получении статистики оценок: {e}")
             return {}
 
-    def get_all_tickets(self) -> List[Dict]:
-        """Получение всех заявок"""
+    def get_all_tickets(self) -> List[sqlite3.Row]:
+        """Получение всех заявок (включая архив)"""
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('SELECT * FROM tickets ORDER BY created_at DESC')
-            return [dict(row) for row in cursor.fetchall()]
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                sql, params = self._tickets_union()
+                cursor.execute(f'{sql} ORDER BY created_at DESC', params)
+                return cursor.fetchall()
         except Exception as e:
             logging.error(f"Ошибка при получении всех заявок: {e}")
             return []
 
+    def iter_tickets(self, status: Optional[TicketStatus] = None, date_from: Optional[str] = None,
+                     date_to: Optional[str] = None, batch_size: int = 500) -> Iterator[sqlite3.Row]:
+        """Потоковое чтение заявок, включая архив, порциями fetchmany (память не зависит от размера таблицы)
+
+        date_from и date_to - даты создания в формате YYYY-MM-DD включительно.
+        """
+        conditions = []
+        params = []
+        if status is not None:
+            conditions.append('status = ?')
+            params.append(status.value)
+        if date_from:
+            conditions.append('created_at >= ?')
+            params.append(date_from)
+        if date_to:
+            conditions.append("created_at < DATE(?, '+1 day')")
+            params.append(date_to)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        sql, params = self._tickets_union(where, params)
+        return self._iter_rows(f'{sql} ORDER BY created_at, id', params, batch_size)
+
+    def get_user_tickets_batch(self, user_id: int, batch_size: int = 20,
+                               after: Optional[tuple] = None) -> List[sqlite3.Row]:
+        """Порция заявок пользователя (включая архив), новые первыми
+
+        after - (created_at, id) последней заявки предыдущей порции. Каждая порция - отдельный
+        короткий запрос, соединение между порциями не удерживается.
+        """
+        cursor_key = after or (None, None)
+        condition = 'user_id = ? AND (? IS NULL OR (created_at, id) < (?, ?))'
+        params = (user_id, cursor_key[1], *cursor_key)
+        try:
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
+                sql, params = self._tickets_union(f'WHERE {condition}', params)
+                cursor.execute(f'{sql} ORDER BY created_at DESC, id DESC LIMIT ?', (*params, batch_size))
+                return cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Ошибка при получении заявок пользователя {user_id}: {e}")
+            return []
+
+    def iter_user_tickets(self, user_id: int, batch_size: int = 20) -> Iterator[sqlite3.Row]:
+        """Потоковое чтение заявок пользователя порциями get_user_tickets_batch"""
+        after = None
+        while True:
+            rows = self.get_user_tickets_batch(user_id, batch_size, after)
+            yield from rows
+            if len(rows) < batch_size:
+                break
+            after = (rows[-1]['created_at'], rows[-1]['id'])
+
+    def _iter_rows(self, sql: str, params, batch_size: int) -> Iterator[sqlite3.Row]:
+        """Генератор строк запроса: читает порциями fetchmany, соединение занято до исчерпания или close()"""
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+
+    def bulk_insert_tickets(self, rows: Iterable[tuple], batch_size: int = 50000) -> int:
+        """Массовая загрузка заявок; возвращает количество добавленных
+
+        Строки - кортежи в порядке BULK_COLUMNS (id может быть None). Индексы и триггеры
+        таблицы снимаются на время загрузки и создаются заново в конце, счетчики (с учетом
+        архива), сводка оценок и полнотекстовый индекс пересчитываются один раз.
+
+        Вся загрузка - одна транзакция: при ошибке откатываются и данные, и снятие индексов
+        и триггеров, а запись других соединений (работающего бота) ждет ее окончания
+        (busy_timeout) и не может пройти мимо снятых триггеров. batch_size - размер порции
+        executemany и шаг вывода прогресса.
+        """
+        placeholders = ', '.join('?' * len(BULK_COLUMNS))
+        insert_sql = f"INSERT INTO main.tickets ({', '.join(BULK_COLUMNS)}) VALUES ({placeholders})"
+        count = 0
+
+        with self.pool.writer() as conn:
+            if conn.in_transaction:
+                conn.commit()
+            cursor = conn.cursor()
+            try:
+                # Первая же команда - запись в main, поэтому блокируется только база заявок
+                cursor.execute('BEGIN')
+                cursor.execute('''
+                    SELECT type, name, sql FROM main.sqlite_master 
+                    WHERE tbl_name = 'tickets' AND type IN ('index', 'trigger') AND sql IS NOT NULL
+                ''')
+                deferred = cursor.fetchall()
+
+                # Восстанавливаются только действительно снятые объекты
+                dropped = []
+                for kind, name, sql in deferred:
+                    cursor.execute(f'DROP {kind.upper()} main.{name}')
+                    dropped.append(sql)
+
+                batch = []
+                for row in rows:
+                    batch.append(row)
+                    if len(batch) >= batch_size:
+                        cursor.executemany(insert_sql, batch)
+                        count += len(batch)
+                        batch = []
+                        logging.info(f"Загружено заявок: {count}")
+                if batch:
+                    cursor.executemany(insert_sql, batch)
+                    count += len(batch)
+
+                for sql in dropped:
+                    cursor.execute(sql)
+                self._rebuild_counters(cursor)
+                self._rebuild_rating_summary(cursor)
+                if self.search_enabled:
+                    cursor.execute("INSERT INTO tickets_fts (tickets_fts) VALUES ('rebuild')")
+                conn.commit()
+            except Exception as e:
+                logging.error(f"Ошибка при массовой загрузке заявок, изменения отменены: {e}")
+                conn.rollback()
+                raise
+
+        logging.info(f"Массовая загрузка завершена, добавлено заявок: {count}")
+        return count
+
     def get_tickets_stats(self) -> Dict:
         """Получение статистики по заявкам"""
         try:
-            cursor = self.conn.cursor()
-
-            # Общее количество заявок
-            cursor.execute("SELECT COUNT(*) FROM tickets")
-            total = cursor.fetchone()[0]
+            with self.pool.reader() as conn:
+                cursor = conn.cursor()
 
-            # Заявки по статусам
-            cursor.execute("SELECT status, COUNT(*) FROM tickets GROUP BY status")
-            status_stats = {row[0]: row[1] for row in cursor.fetchall()}
+                # Заявки по статусам
+                cursor.execute("SELECT status, count FROM ticket_counters")
+                status_stats = {row[0]: row[1] for row in cursor.fetchall()}
 
-            # Заявки за сегодня
-            cursor.execute("SELECT COUNT(*) FROM tickets WHERE DATE(created_at) = DATE('now')")
-            today = cursor.fetchone()[0]
+                # Заявки за сегодня
+                cursor.execute("SELECT created FROM ticket_daily_stats WHERE day = DATE('now')")
+                row = cursor.fetchone()
+                today = row[0] if row else 0
 
-            return {
-                'total': total,
-                'open': status_stats.get('open', 0),
-                'in_progress': status_stats.get('in_progress', 0),
-                'closed': status_stats.get('closed', 0),
-                'today': today
-            }
+                return {
+                    'total': sum(status_stats.values()),
+                    'open': status_stats.get('open', 0),
+                    'in_progress': status_stats.get('in_progress', 0),
+                    'closed': status_stats.get('closed', 0),
+                    'today': today
+                }
         except Exception as e:
             logging.error(f"Ошибка при получении статистики: {e}")
             return {
@@ -272,33 +1105,23 @@ class Database:
             }
 
     def _row_to_ticket(self, row) -> Ticket:
-        """Преобразование строки базы данных в объект Ticket"""
+        """Преобразование строки базы данных в объект Ticket (даты разбираются при обращении)"""
         try:
-            created_at = datetime.fromisoformat(row['created_at']) if row['created_at'] else None
-            closed_at = datetime.fromisoformat(row['closed_at']) if row['closed_at'] else None
-
-            return Ticket(
-                id=row['id'],
-                user_id=row['user_id'],
-                full_name=row['full_name'],
-                room=row['room'],
-                problem=row['problem'],
-                status=TicketStatus(row['status']),
-                created_at=created_at,
-                closed_by=row['closed_by'],
-                closed_at=closed_at,
-                admin_response=row['admin_response'],
-                rating=row['rating'],
-                feedback=row['feedback']
-            )
+            return Ticket.from_row(row)
         except Exception as e:
             logging.error(f"Ошибка преобразования строки в объект Ticket: {e}")
             raise
 
     def close(self):
         """Закрытие соединения с базой данных"""
-        if self.conn:
-            self.conn.close()
+        if self.pool:
+            self.pool.close()
+            self.pool = None
+            self.conn = None
+            if self.ticket_cache:
+                stats = self.ticket_cache.get_stats()
+                logging.info(f"Кэш заявок: попаданий {stats['hits']}, промахов {stats['misses']} "
+                             f"(доля попаданий {stats['hit_rate']:.0%})")
             logging.info("Соединение с базой данных закрыто")
 
     def __del__(self):
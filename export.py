@@ -0,0 +1,77 @@
+import argparse
+import csv
+import gzip
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+from database import Database
+from models import TicketStatus
+
+EXPORT_FORMATS = ("csv", "jsonl")
+
+EXPORT_FIELDS = [
+    'id', 'user_id', 'full_name', 'room', 'problem', 'status', 'created_at',
+    'closed_by', 'closed_at', 'admin_response', 'rating', 'feedback'
+]
+
+
+def parse_date(value: str) -> str:
+    """Проверка даты в формате YYYY-MM-DD"""
+    return datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+
+
+def export_tickets(db: Database, path: str, fmt: str = "csv", status: Optional[TicketStatus] = None,
+                   date_from: Optional[str] = None, date_to: Optional[str] = None) -> int:
+    """Потоковая выгрузка заявок в сжатый gzip файл CSV или JSONL; возвращает количество строк"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+        rows = db.iter_tickets(status=status, date_from=date_from, date_to=date_to)
+
+        if fmt == "csv":
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_FIELDS)
+            for row in rows:
+                writer.writerow([row[field] for field in EXPORT_FIELDS])
+                count += 1
+        else:
+            for row in rows:
+                f.write(json.dumps({field: row[field] for field in EXPORT_FIELDS}, ensure_ascii=False))
+                f.write("\n")
+                count += 1
+
+    logging.info(f"Выгружено заявок: {count} в {path}")
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка истории заявок в CSV/JSONL (gzip)")
+    parser.add_argument("--db", default="tickets.db", help="файл базы заявок")
+    parser.add_argument("--archive-db", default="tickets_archive.db",
+                        help="файл архива заявок, выгружается вместе с базой, если существует")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv", help="формат выгрузки")
+    parser.add_argument("--status", choices=[status.value for status in TicketStatus], help="фильтр по статусу")
+    parser.add_argument("--from", dest="date_from", type=parse_date, help="дата создания с (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="date_to", type=parse_date, help="дата создания по (YYYY-MM-DD)")
+    parser.add_argument("-o", "--output", help="файл результата (по умолчанию tickets.<формат>.gz)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    output = args.output or f"tickets.{args.format}.gz"
+    status = TicketStatus(args.status) if args.status else None
+
+    archive_db = args.archive_db if args.archive_db and os.path.exists(args.archive_db) else None
+    db = Database(args.db, archive_db_name=archive_db)
+    try:
+        export_tickets(db, output, args.format, status, args.date_from, args.date_to)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import math
+import random
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+from message_scheduler import TokenBucket
+
+# Методы получения обновлений и служебные методы: задержки и ошибки 429 к ним не применяются
+SERVICE_METHODS = {"getupdates", "getme", "deletewebhook", "setwebhook", "getwebhookinfo", "close", "logout"}
+
+# Методы, возвращающие отправленное или измененное сообщение
+MESSAGE_METHODS = {
+    "sendmessage", "editmessagetext", "editmessagereplymarkup", "senddocument", "sendphoto",
+    "forwardmessage", "editmessagecaption"
+}
+
+# Сценарий синтетического пользователя: создание заявки и просмотр своих заявок
+USER_SCRIPT = [
+    "/start", "📋 Создать заявку", "Иванов Иван 89000000000", "101",
+    "Не работает принтер в кабинете", "📊 Мои заявки"
+]
+
+
+class FakeBotAPI:
+    """Локальная замена Telegram Bot API для нагрузочных проверок
+
+    Отдает обновления через getUpdates (long polling), отвечает на методы отправки
+    с настраиваемой задержкой и вставляет ошибки 429 с заданной вероятностью.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 retry_after: int = 1, enforce_limits: bool = False, global_rate: float = 30,
+                 private_rate: float = 1, group_rate_per_minute: float = 20, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.enforce_limits = enforce_limits
+        self.global_rate = global_rate
+        self.private_rate = private_rate
+        self.group_rate = group_rate_per_minute / 60
+        self.rng = random.Random(seed)
+
+        self._updates: deque = deque()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._new_updates = asyncio.Event()
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+
+        # Статистика
+        self.requests = Counter()
+        self.errors_429 = 0
+        self.updates_generated = 0
+        self.updates_delivered = 0
+        self.started_at = time.monotonic()
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/bot{token}/{method}", self.handle_method)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    # Обновления
+
+    def push_update(self, update: dict):
+        """Добавление обновления в очередь getUpdates"""
+        update["update_id"] = next(self._update_ids)
+        self._updates.append(update)
+        self.updates_generated += 1
+        self._new_updates.set()
+
+    def push_message(self, user_id: int, text: str):
+        message_id = next(self._message_ids)
+        self.push_update({
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private", "first_name": "Load"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Load"},
+                "text": text
+            }
+        })
+
+    async def generate_updates(self, rate: float, total: int, users: int):
+        """Генерация сообщений по сценарию USER_SCRIPT с заданной частотой (обновлений в секунду)"""
+        steps = [0] * users
+        interval = 1 / rate if rate else 0
+        for index in range(total):
+            user = index % users
+            self.push_message(100000 + user, USER_SCRIPT[steps[user]])
+            steps[user] = (steps[user] + 1) % len(USER_SCRIPT)
+            if interval:
+                await asyncio.sleep(interval)
+            elif index % 1000 == 999:
+                await asyncio.sleep(0)
+
+    async def _get_updates(self, params: dict) -> List[dict]:
+        offset = int(params.get("offset") or 0)
+        limit = min(int(params.get("limit") or 100), 100)
+        timeout = float(params.get("timeout") or 0)
+
+        # offset подтверждает получение всех обновлений с меньшим номером
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        result = list(itertools.islice(self._updates, limit))
+        self.updates_delivered += len(result)
+        return result
+
+    # Методы Bot API
+
+    async def handle_method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = await self._read_params(request)
+        self.requests[method] += 1
+
+        if method == "getupdates":
+            return self._ok(await self._get_updates(params))
+        if method == "getme":
+            return self._ok({"id": 123456, "is_bot": True, "first_name": "Fake bot", "username": "fake_bot"})
+        if method in SERVICE_METHODS:
+            return self._ok(True)
+
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        retry_after = self._check_limits(params)
+        if retry_after:
+            self.errors_429 += 1
+            return web.json_response({
+                "ok": False,
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {retry_after}",
+                "parameters": {"retry_after": retry_after}
+            }, status=429)
+
+        if method in MESSAGE_METHODS:
+            return self._ok(self._message(params))
+        if method == "getchat":
+            return self._ok(self._chat(int(params.get("chat_id") or 0)))
+        return self._ok(True)
+
+    def _check_limits(self, params: dict) -> int:
+        """Секунды ожидания для ответа 429 или 0"""
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return self.retry_after
+
+        if not self.enforce_limits:
+            return 0
+
+        chat_id = int(params.get("chat_id") or 0)
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Отрицательный ID - группа: лимит Bot API задан в сообщениях в минуту
+            rate = self.group_rate if chat_id < 0 else self.private_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, 3)
+
+        for limit in (self._global_bucket, bucket):
+            delay = limit.reserve()
+            if delay:
+                # Отклоненный запрос не расходует лимит
+                limit.tokens += 1
+                return max(1, math.ceil(delay))
+        return 0
+
+    def _chat(self, chat_id: int) -> dict:
+        if chat_id > 0:
+            return {"id": chat_id, "type": "private", "first_name": "Load"}
+        return {"id": chat_id, "type": "supergroup", "title": "Support"}
+
+    def _message(self, params: dict) -> dict:
+        message = {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": self._chat(int(params.get("chat_id") or 0))
+        }
+        if params.get("text"):
+            message["text"] = params["text"]
+        return message
+
+    @staticmethod
+    async def _read_params(request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = dict(request.query)
+        if request.method == "POST":
+            for key, value in (await request.post()).items():
+                # Файлы (sendDocument) не сохраняются
+                params[key] = value if isinstance(value, str) else None
+        return params
+
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    # Статистика
+
+    def get_stats(self) -> dict:
+        return {
+            "uptime_s": round(time.monotonic() - self.started_at, 1),
+            "updates_generated": self.updates_generated,
+            "updates_delivered": self.updates_delivered,
+            "updates_pending": len(self._updates),
+            "requests": dict(self.requests),
+            "errors_429": self.errors_429
+        }
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.get_stats())
+
+    async def report(self, interval: float):
+        """Периодический вывод пропускной способности в лог"""
+        previous = self.get_stats()
+        while True:
+            await asyncio.sleep(interval)
+            current = self.get_stats()
+            delivered = (current["updates_delivered"] - previous["updates_delivered"]) / interval
+            sent = (sum(current["requests"].values()) - sum(previous["requests"].values())) / interval
+            errors = current["errors_429"] - previous["errors_429"]
+            logging.info(f"Обновлений выдано: {delivered:.0f}/с, запросов: {sent:.0f}/с, "
+                         f"ошибок 429: {errors}, в очереди: {current['updates_pending']}")
+            previous = current
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Локальная замена Telegram Bot API для нагрузочных проверок")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка ответа на методы отправки, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="случайная добавка к задержке, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429, с")
+    parser.add_argument("--enforce-limits", action="store_true", help="отвечать 429 при превышении лимитов Bot API")
+    parser.add_argument("--group-rate-per-minute", type=float, default=20,
+                        help="лимит сообщений в группу в минуту для --enforce-limits")
+    parser.add_argument("--updates", type=int, default=0, help="количество генерируемых обновлений")
+    parser.add_argument("--updates-rate", type=float, default=0, help="обновлений в секунду (0 - сразу все)")
+    parser.add_argument("--users", type=int, default=1000, help="количество синтетических пользователей")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="период вывода статистики, с")
+    parser.add_argument("--seed", type=int, help="зерно генератора случайных чисел")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    api = FakeBotAPI(args.latency, args.jitter, args.error_rate, args.retry_after,
+                     args.enforce_limits, group_rate_per_minute=args.group_rate_per_minute, seed=args.seed)
+
+    runner = web.AppRunner(api.create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+    logging.info(f"Тестовый Bot API запущен: http://{args.host}:{args.port} (BOT_API_URL для бота)")
+
+    tasks = [asyncio.create_task(api.report(args.report_interval))]
+    if args.updates:
+        tasks.append(asyncio.create_task(api.generate_updates(args.updates_rate, args.updates, args.users)))
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await runner.cleanup()
+        logging.info(f"Итог: {json.dumps(api.get_stats(), ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
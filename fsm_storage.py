@@ -0,0 +1,248 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.exceptions import DataNotDictLikeError
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+
+from connection_manager import ConnectionManager
+
+
+class _SessionRecord:
+    __slots__ = ('state', 'data', 'updated_at')
+
+    def __init__(self, state: Optional[str] = None, data: Optional[Dict[str, Any]] = None,
+                 updated_at: Optional[float] = None):
+        self.state = state
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at if updated_at is not None else time.time()
+
+    def is_empty(self) -> bool:
+        return self.state is None and not self.data
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite: чтение из LRU-кэша, пакетная отложенная запись, TTL для сессий"""
+
+    def __init__(self, db_name: str = "fsm.db", cache_size: int = 10000, flush_interval: float = 1.0,
+                 flush_batch: int = 500, session_ttl: int = 86400, cleanup_interval: int = 600,
+                 key_builder: Optional[KeyBuilder] = None, synchronous: str = "NORMAL"):
+        self.db_name = db_name
+        self.cache_size = cache_size
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.session_ttl = session_ttl
+        self.cleanup_interval = cleanup_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True, with_bot_id=True)
+
+        # Записи в кэше и ожидающие записи на диск
+        self._cache: "OrderedDict[str, _SessionRecord]" = OrderedDict()
+        self._dirty: Dict[str, _SessionRecord] = {}
+        self._flushing: Dict[str, _SessionRecord] = {}
+        self._closed = False
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-db")
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_event: Optional[asyncio.Event] = None
+        self._last_cleanup = time.time()
+
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.flushes = 0
+
+        self.pool = ConnectionManager(db_name, synchronous=synchronous, read_pool_size=0)
+        self.init_db()
+
+    def init_db(self):
+        """Создание таблицы FSM-сессий"""
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS fsm_sessions (
+                    key TEXT PRIMARY KEY,
+                    state TEXT,
+                    data TEXT NOT NULL DEFAULT '{}',
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_fsm_updated_at ON fsm_sessions (updated_at)
+            ''')
+            conn.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = self.key_builder.build(key)
+        record = await self._get_record(storage_key)
+        record.state = state.state if isinstance(state, State) else state
+        self._mark_dirty(storage_key, record)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        record = await self._get_record(self.key_builder.build(key))
+        return record.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise DataNotDictLikeError(
+                f"Data must be a dict or dict-like object, got {type(data).__name__}"
+            )
+        storage_key = self.key_builder.build(key)
+        record = await self._get_record(storage_key)
+        record.data = data.copy()
+        self._mark_dirty(storage_key, record)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        record = await self._get_record(self.key_builder.build(key))
+        return record.data.copy()
+
+    async def close(self) -> None:
+        """Запись несохранённых изменений и закрытие базы"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self._flush()
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+        logging.info("FSM-хранилище закрыто")
+
+    def get_stats(self) -> Dict:
+        """Статистика кэша FSM-сессий"""
+        return {
+            'cached': len(self._cache),
+            'dirty': len(self._dirty),
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'flushes': self.flushes
+        }
+
+    async def _get_record(self, key: str) -> _SessionRecord:
+        record = self._cache.get(key) or self._dirty.get(key) or self._flushing.get(key)
+        if record is not None:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+            loop = asyncio.get_running_loop()
+            record = await loop.run_in_executor(self._executor, self._load, key)
+            # За время чтения запись могла появиться в кэше
+            record = self._cache.get(key) or self._dirty.get(key) or self._flushing.get(key) or record
+
+        if self.session_ttl and not record.is_empty() and time.time() - record.updated_at > self.session_ttl:
+            record = _SessionRecord()
+            self._mark_dirty(key, record)
+
+        self._cache[key] = record
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return record
+
+    def _mark_dirty(self, key: str, record: _SessionRecord):
+        record.updated_at = time.time()
+        self._dirty[key] = record
+        self._ensure_flush_task()
+        if len(self._dirty) >= self.flush_batch:
+            self._flush_event.set()
+
+    def _ensure_flush_task(self):
+        if self._flush_task is None:
+            self._flush_event = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+
+            try:
+                await self._flush()
+                if time.time() - self._last_cleanup > self.cleanup_interval:
+                    await self._cleanup()
+            except Exception as e:
+                logging.error(f"Ошибка записи FSM-сессий: {e}")
+
+    async def _flush(self):
+        """Пакетная запись изменённых сессий одной транзакцией"""
+        if not self._dirty:
+            return
+        batch, self._dirty = self._dirty, {}
+        self._flushing = batch
+
+        # Сериализуем в потоке event loop, чтобы записи не менялись во время сохранения
+        upserts = []
+        deletes = []
+        for key, record in batch.items():
+            if record.is_empty():
+                deletes.append((key,))
+            else:
+                upserts.append((key, record.state, json.dumps(record.data, ensure_ascii=False),
+                                record.updated_at))
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._write_batch, upserts, deletes)
+            self.flushes += 1
+        except Exception:
+            # Возвращаем неудачный пакет, не затирая более свежие изменения
+            for key, record in batch.items():
+                self._dirty.setdefault(key, record)
+            raise
+        finally:
+            self._flushing = {}
+
+    async def _cleanup(self):
+        """Удаление устаревших сессий из кэша и базы"""
+        self._last_cleanup = time.time()
+        if not self.session_ttl:
+            return
+        expire_before = time.time() - self.session_ttl
+        for key in [key for key, record in self._cache.items() if record.updated_at < expire_before]:
+            del self._cache[key]
+        loop = asyncio.get_running_loop()
+        removed = await loop.run_in_executor(self._executor, self._delete_expired, expire_before)
+        if removed:
+            logging.info(f"Удалено устаревших FSM-сессий: {removed}")
+
+    def _load(self, key: str) -> _SessionRecord:
+        with self.pool.reader() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT state, data, updated_at FROM fsm_sessions WHERE key = ?', (key,))
+            row = cursor.fetchone()
+        if not row:
+            return _SessionRecord(updated_at=0)
+        return _SessionRecord(row['state'], json.loads(row['data']), row['updated_at'])
+
+    def _write_batch(self, upserts: list, deletes: list):
+        with self.pool.writer() as conn:
+            try:
+                cursor = conn.cursor()
+                if upserts:
+                    cursor.executemany('''
+                        INSERT INTO fsm_sessions (key, state, data, updated_at)
+                        VALUES (?, ?, ?, ?)
+                        ON CONFLICT(key) DO UPDATE SET
+                            state = excluded.state, data = excluded.data, updated_at = excluded.updated_at
+                    ''', upserts)
+                if deletes:
+                    cursor.executemany('DELETE FROM fsm_sessions WHERE key = ?', deletes)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def _delete_expired(self, expire_before: float) -> int:
+        with self.pool.writer() as conn:
+            cursor = conn.cursor()
+            cursor.execute('DELETE FROM fsm_sessions WHERE updated_at < ?', (expire_before,))
+            conn.commit()
+            return cursor.rowcount
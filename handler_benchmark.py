@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import re
+import subprocess
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import AsyncGenerator, Dict, List, Optional
+
+import aiogram
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Chat, Message, Update
+
+from async_database import AsyncDatabase, AsyncBlockedDatabase
+from blocked_database import BlockedDatabase
+from bulk_import import generate_tickets
+from config import load_config
+from database import Database
+from fsm_storage import SQLiteStorage
+from main import create_dispatcher
+from message_scheduler import scheduler
+
+SUPPORT_CHAT_ID = -1001000000000
+USER_ID_BASE = 1000000
+ADMIN_ID_BASE = 2000000
+
+TICKET_CREATED_RE = re.compile(r"заявка #(\d+) создана")
+
+
+class RecordingSession(BaseSession):
+    """Сессия Bot API без сети: запоминает вызовы методов и возвращает правдоподобные ответы"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = Counter()
+        self.last_text: Dict[int, str] = {}
+        self._message_ids = itertools.count(1)
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[TelegramType],
+                           timeout: Optional[int] = None) -> TelegramType:
+        self.calls[method.__api_method__] += 1
+        chat_id = getattr(method, "chat_id", None) or 0
+        text = getattr(method, "text", None)
+        if text is not None:
+            self.last_text[chat_id] = text
+
+        if method.__returning__ is bool:
+            return True
+        if method.__returning__ is Chat:
+            return Chat(id=chat_id, type="private", first_name="Bench")
+        return Message(message_id=next(self._message_ids), date=datetime.now(),
+                       chat=Chat(id=chat_id, type="private"), text=text)
+
+    async def stream_content(self, url: str, headers: Optional[Dict] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self) -> None:
+        pass
+
+
+class UpdateFactory:
+    """Синтетические обновления от пользователей и администраторов"""
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": "Bench"}
+
+    def _chat(self, chat_id: int) -> dict:
+        if chat_id > 0:
+            return {"id": chat_id, "type": "private", "first_name": "Bench"}
+        return {"id": chat_id, "type": "supergroup", "title": "Bench"}
+
+    def message(self, user_id: int, text: str, chat_id: Optional[int] = None) -> Update:
+        update_id = next(self._ids)
+        return Update.model_validate({
+            "update_id": update_id,
+            "message": {
+                "message_id": update_id,
+                "date": int(time.time()),
+                "chat": self._chat(chat_id or user_id),
+                "from": self._user(user_id),
+                "text": text
+            }
+        })
+
+    def callback(self, user_id: int, chat_id: int, data: str) -> Update:
+        update_id = next(self._ids)
+        return Update.model_validate({
+            "update_id": update_id,
+            "callback_query": {
+                "id": str(update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(chat_id),
+                "data": data,
+                "message": {
+                    "message_id": update_id,
+                    "date": int(time.time()),
+                    "chat": self._chat(chat_id),
+                    "text": "bench"
+                }
+            }
+        })
+
+
+class HandlerBenchmark:
+    """Прогон сценариев пользователя и администратора через настоящий диспетчер"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, session: RecordingSession):
+        self.dp = dp
+        self.bot = bot
+        self.session = session
+        self.updates = UpdateFactory()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors = 0
+
+    async def feed(self, step: str, update: Update):
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Ошибка на шаге {step}: {e}")
+        self.latencies[step].append(time.perf_counter() - started)
+
+    async def ticket_flow(self, index: int):
+        """Создание заявки, взятие в работу, закрытие и оценка"""
+        user_id = USER_ID_BASE + index
+        admin_id = ADMIN_ID_BASE + index
+
+        await self.feed("start", self.updates.message(user_id, "/start"))
+        await self.feed("create_ticket", self.updates.message(user_id, "📋 Создать заявку"))
+        await self.feed("full_name", self.updates.message(user_id, f"Пользователь {index} 89000000000"))
+        await self.feed("room", self.updates.message(user_id, str(100 + index % 300)))
+        await self.feed("problem", self.updates.message(user_id, f"Не работает принтер в кабинете, заявка {index}"))
+
+        match = TICKET_CREATED_RE.search(self.session.last_text.get(user_id, ""))
+        if not match:
+            self.errors += 1
+            logging.error(f"Заявка пользователя {user_id} не создана")
+            return
+        ticket_id = match.group(1)
+
+        await self.feed("open_tickets", self.updates.message(admin_id, "/open_tickets"))
+        await self.feed("take_to_work", self.updates.callback(admin_id, SUPPORT_CHAT_ID, f"take_to_work_{ticket_id}"))
+        await self.feed("close", self.updates.callback(admin_id, SUPPORT_CHAT_ID, f"close_{ticket_id}"))
+        # Администратор отвечает в чате поддержки, где нажал кнопку закрытия
+        await self.feed("closer_name", self.updates.message(admin_id, "Администратор", SUPPORT_CHAT_ID))
+        await self.feed("response", self.updates.message(admin_id, "Заменен картридж", SUPPORT_CHAT_ID))
+
+        # После закрытия пользователю приходит запрос на оценку
+        if not self.session.last_text.get(user_id, "").startswith("⭐ Оцените"):
+            self.errors += 1
+            logging.error(f"Заявка #{ticket_id} не закрыта")
+            return
+
+        await self.feed("rate", self.updates.callback(user_id, user_id, f"rate_{ticket_id}_5"))
+        await self.feed("feedback", self.updates.message(user_id, "Спасибо, быстро!"))
+        await self.feed("my_tickets", self.updates.message(user_id, "📊 Мои заявки"))
+
+    async def run(self, flows: int, concurrency: int) -> float:
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(index: int):
+            async with semaphore:
+                await self.ticket_flow(index)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[limited(index) for index in range(flows)])
+        return time.perf_counter() - started
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Перцентили задержки в миллисекундах"""
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def at(p: float) -> float:
+        return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 3)
+
+    return {"p50": at(0.5), "p95": at(0.95), "p99": at(0.99), "max": round(values[-1] * 1000, 3)}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmark(flows: int, concurrency: int, preload: int, workdir: str, use_scheduler: bool) -> Dict:
+    config = load_config()
+    config.SUPPORT_CHAT_ID = SUPPORT_CHAT_ID
+    config.ADMIN_IDS = [ADMIN_ID_BASE + index for index in range(flows)]
+    # Сценарии отправляют обновления без пауз - ограничение частоты исказило бы замер
+    config.THROTTLE_ENABLED = False
+
+    blocked_db = AsyncBlockedDatabase(BlockedDatabase(os.path.join(workdir, "blocked_users.db")))
+    database = Database(os.path.join(workdir, "tickets.db"), synchronous=config.DB_SYNCHRONOUS,
+                        read_pool_size=config.DB_READ_POOL_SIZE,
+                        blocked_db_name=os.path.join(workdir, "blocked_users.db"),
+                        ticket_cache_size=config.TICKET_CACHE_SIZE if config.TICKET_CACHE_ENABLED else 0)
+    if preload:
+        database.bulk_insert_tickets(generate_tickets(preload, max(preload // 10, 1), 365, 0.6, random.Random(1)))
+    db = AsyncDatabase(database, group_commit_ms=config.DB_GROUP_COMMIT_MS,
+                       group_commit_max_ops=config.DB_GROUP_COMMIT_MAX_OPS)
+    storage = SQLiteStorage(os.path.join(workdir, "fsm.db"))
+
+    session = RecordingSession()
+    bot = Bot(token="123456:benchmark", session=session)
+    dp = create_dispatcher(storage, db, blocked_db, config)
+    benchmark = HandlerBenchmark(dp, bot, session)
+
+    # По умолчанию очередь отправки не запускается: лимиты Bot API не должны влиять на замер обработчиков
+    if use_scheduler:
+        scheduler.configure(global_rate=config.SEND_GLOBAL_RATE, private_rate=config.SEND_PRIVATE_RATE,
+                            group_rate_per_minute=config.SEND_GROUP_RATE_PER_MINUTE, workers=config.SEND_WORKERS,
+                            group_reserve=config.SEND_GROUP_RESERVE)
+        await scheduler.start()
+
+    try:
+        duration = await benchmark.run(flows, concurrency)
+        cache_stats = db.get_cache_stats()
+        group_commit_stats = db.get_group_commit_stats()
+    finally:
+        if use_scheduler:
+            await scheduler.stop()
+        await storage.close()
+        await bot.session.close()
+        await db.close()
+        blocked_db.close()
+
+    all_latencies = [latency for values in benchmark.latencies.values() for latency in values]
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "aiogram": aiogram.__version__,
+        "params": {"flows": flows, "concurrency": concurrency, "preload": preload, "scheduler": use_scheduler},
+        "updates": len(all_latencies),
+        "errors": benchmark.errors,
+        "duration_s": round(duration, 3),
+        "updates_per_s": round(len(all_latencies) / duration, 1) if duration else None,
+        "latency_ms": percentiles(all_latencies),
+        "steps": {step: percentiles(values) for step, values in benchmark.latencies.items()},
+        "api_calls": dict(session.calls),
+        "ticket_cache": cache_stats,
+        "group_commit": group_commit_stats
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный замер обработчиков бота без обращения к Telegram")
+    parser.add_argument("--flows", type=int, default=200, help="количество сценариев заявки")
+    parser.add_argument("--concurrency", type=int, default=20, help="параллельных сценариев")
+    parser.add_argument("--preload", type=int, default=0, help="заявок в базе перед замером")
+    parser.add_argument("--scheduler", action="store_true", help="отправлять ответы через очередь с лимитами")
+    parser.add_argument("--workdir", help="каталог для баз (по умолчанию временный)")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="файл с результатами")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        result = await run_benchmark(args.flows, args.concurrency, args.preload, workdir, args.scheduler)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    latency = result["latency_ms"]
+    print(f"Обновлений: {result['updates']}, ошибок: {result['errors']}, {result['updates_per_s']} обновл./с")
+    print(f"Задержка обработчика: p50 {latency['p50']} мс, p95 {latency['p95']} мс, p99 {latency['p99']} мс")
+    print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
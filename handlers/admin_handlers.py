@@ -1,15 +1,23 @@
+import logging
+import os
+import tempfile
+from datetime import datetime
+
 from aiogram import Router, F, Bot
-from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
+from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove, FSInputFile
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import Command
+from aiogram.exceptions import TelegramBadRequest
 
-from database import Database, TicketStatus
-from blocked_database import BlockedDatabase
+from async_database import AsyncDatabase, AsyncBlockedDatabase
+from models import TicketStatus
 from keyboards import get_ticket_action_keyboard, get_block_user_keyboard, get_unblock_user_keyboard, \
-    get_in_progress_ticket_keyboard, get_rating_keyboard
+    get_in_progress_ticket_keyboard, get_rating_keyboard, get_tickets_page_keyboard, get_search_results_keyboard
 from config import Config
+from export import EXPORT_FORMATS, parse_date
 from utils import format_ticket_message, notify_user, safe_get_user_info, ask_for_rating
+from structured_logging import bind_ticket
 
 
 class CloseTicketForm(StatesGroup):
@@ -36,19 +44,20 @@ admin_router = Router()
 
 # Перевод заявки в работу
 @admin_router.callback_query(F.data.startswith("take_to_work_"))
-async def take_ticket_to_work(callback: CallbackQuery, db: Database, bot: Bot):
+async def take_ticket_to_work(callback: CallbackQuery, db: AsyncDatabase, bot: Bot):
     ticket_id = int(callback.data.split("_")[3])
+    bind_ticket(ticket_id)
 
-    # Обновляем статус заявки
-    db.update_ticket_status(
-        ticket_id=ticket_id,
-        status=TicketStatus.IN_PROGRESS
-    )
+    # Обновляем статус заявки и получаем ее одним запросом
+    ticket = await db.take_ticket_to_work(ticket_id)
 
-    ticket = db.get_ticket(ticket_id)
+    # Заявку уже взял другой администратор или она закрыта - повторно не уведомляем
+    if not ticket:
+        await callback.answer("❌ Заявка уже взята в работу или закрыта!", show_alert=True)
+        return
 
     # Уведомляем пользователя
-    if ticket and ticket.user_id:
+    if ticket.user_id:
         user_message = (
             f"🟡 Ваша заявка #{ticket.id} взята в работу\n\n"
             f"Технический специалист начал работу над вашей проблемой.\n"
@@ -87,27 +96,25 @@ async def take_to_work_command(message: Message, state: FSMContext, config: Conf
 
 
 @admin_router.message(TakeToWorkForm.waiting_for_ticket_id)
-async def process_take_to_work_ticket_id(message: Message, state: FSMContext, db: Database, bot: Bot):
+async def process_take_to_work_ticket_id(message: Message, state: FSMContext, db: AsyncDatabase, bot: Bot):
     try:
         ticket_id = int(message.text.strip())
-        ticket = db.get_ticket(ticket_id)
+        bind_ticket(ticket_id)
 
-        if not ticket:
-            await message.answer("❌ Заявка с таким номером не найдена!")
-            await state.clear()
-            return
+        # Обновляем статус заявки, только если она еще открыта
+        ticket = await db.take_ticket_to_work(ticket_id)
 
-        if ticket.status == TicketStatus.CLOSED:
-            await message.answer("❌ Эта заявка уже закрыта!")
+        if not ticket:
+            current = await db.get_ticket(ticket_id)
+            if not current:
+                await message.answer("❌ Заявка с таким номером не найдена!")
+            elif current.status == TicketStatus.CLOSED:
+                await message.answer("❌ Эта заявка уже закрыта!")
+            else:
+                await message.answer("❌ Эта заявка уже в работе!")
             await state.clear()
             return
 
-        # Обновляем статус заявки
-        db.update_ticket_status(
-            ticket_id=ticket_id,
-            status=TicketStatus.IN_PROGRESS
-        )
-
         # Уведомляем пользователя
         if ticket.user_id:
             user_message = (
@@ -130,14 +137,18 @@ async def process_take_to_work_ticket_id(message: Message, state: FSMContext, db
 
 # Обработчик закрытия заявки
 @admin_router.callback_query(F.data.startswith("close_"))
-async def close_ticket_start(callback: CallbackQuery, state: FSMContext, db: Database):
+async def close_ticket_start(callback: CallbackQuery, state: FSMContext, db: AsyncDatabase):
     ticket_id = int(callback.data.split("_")[1])
+    bind_ticket(ticket_id)
 
     # Проверяем статус заявки
-    ticket = db.get_ticket(ticket_id)
+    ticket = await db.get_ticket(ticket_id)
     if ticket.status == TicketStatus.OPEN:
         await callback.answer("❌ Сначала возьмите заявку в работу!", show_alert=True)
         return
+    if ticket.status == TicketStatus.CLOSED:
+        await callback.answer("❌ Эта заявка уже закрыта!", show_alert=True)
+        return
 
     await state.update_data(ticket_id=ticket_id)
     await state.set_state(CloseTicketForm.waiting_for_closer_name)
@@ -150,11 +161,11 @@ async def close_ticket_start(callback: CallbackQuery, state: FSMContext, db: Dat
 
 
 @admin_router.message(CloseTicketForm.waiting_for_closer_name)
-async def process_closer_name(message: Message, state: FSMContext, db: Database):
+async def process_closer_name(message: Message, state: FSMContext, db: AsyncDatabase):
     await state.update_data(closer_name=message.text)
     data = await state.get_data()
 
-    ticket = db.get_ticket(data['ticket_id'])
+    ticket = await db.get_ticket(data['ticket_id'])
 
     await state.set_state(CloseTicketForm.waiting_for_response)
     await message.answer(
@@ -164,18 +175,23 @@ async def process_closer_name(message: Message, state: FSMContext, db: Database)
 
 
 @admin_router.message(CloseTicketForm.waiting_for_response)
-async def process_response(message: Message, state: FSMContext, db: Database, bot: Bot):
+async def process_response(message: Message, state: FSMContext, db: AsyncDatabase, bot: Bot):
     data = await state.get_data()
     response = message.text if message.text.lower() != 'нет' else None
+    bind_ticket(data['ticket_id'])
 
-    db.update_ticket_status(
+    # Закрываем заявку и получаем ее одним запросом
+    ticket = await db.close_ticket(
         ticket_id=data['ticket_id'],
-        status=TicketStatus.CLOSED,
         closed_by=data['closer_name'],
         response=response
     )
 
-    ticket = db.get_ticket(data['ticket_id'])
+    # Заявку уже закрыл другой администратор - повторно не уведомляем
+    if not ticket:
+        await message.answer(f"❌ Заявка #{data['ticket_id']} уже закрыта!")
+        await state.clear()
+        return
 
     # Уведомляем пользователя
     if ticket.user_id:
@@ -195,81 +211,231 @@ async def process_response(message: Message, state: FSMContext, db: Database, bo
     await state.clear()
 
 
+# Отметка заблокированного пользователя в списках заявок
+BLOCKED_MARK = " 🚫"
+
+# Заголовки постраничных списков заявок
+TICKETS_PAGE_VIEWS = {
+    TicketStatus.OPEN: ("🟢", "🟢 Новые заявки", "🎉 Нет новых открытых заявок!"),
+    TicketStatus.IN_PROGRESS: ("🟡", "🟡 Заявки в работе", "📊 Нет заявок в работе."),
+}
+
+
+def format_tickets_page(status: TicketStatus, tickets: list, total: int) -> str:
+    """Текст страницы списка заявок"""
+    emoji, title, _ = TICKETS_PAGE_VIEWS[status]
+    lines = [f"{title}: {total}\n"]
+
+    for ticket in tickets:
+        lines.append(
+            f"{emoji} #{ticket['id']} | 🚪 {ticket['room']} | 📅 {ticket['created_at']}\n"
+            f"👤 {ticket['full_name']}{BLOCKED_MARK if ticket['user_blocked'] else ''}\n"
+            f"📝 {ticket['problem'][:100]}{'...' if len(ticket['problem']) > 100 else ''}\n"
+        )
+
+    return "\n".join(lines)
+
+
+async def get_tickets_page_view(db: AsyncDatabase, status: TicketStatus, page_size: int,
+                                after_id: int = None, before_id: int = None):
+    """Загрузка страницы заявок; возвращает текст и клавиатуру или None, если заявок нет"""
+    page = await db.get_tickets_page(status, page_size, after_id=after_id, before_id=before_id)
+
+    # Заявки могли смениться статусом - возвращаемся к первой странице
+    if not page['tickets'] and (after_id is not None or before_id is not None):
+        page = await db.get_tickets_page(status, page_size)
+
+    if not page['tickets']:
+        return None
+
+    total = await db.count_tickets(status)
+    text = format_tickets_page(status, page['tickets'], total)
+    keyboard = get_tickets_page_keyboard(status.value, page['tickets'], page['has_prev'], page['has_next'])
+    return text, keyboard
+
+
 # Команда для вывода открытых заявок
 @admin_router.message(Command("open_tickets"))
 @admin_router.message(F.text == "📋 Открытые заявки")
-async def show_open_tickets(message: Message, db: Database, config: Config):
+async def show_open_tickets(message: Message, db: AsyncDatabase, config: Config):
     if message.from_user.id not in config.ADMIN_IDS:
         await message.answer("❌ Эта команда только для администраторов!")
         return
 
-    open_tickets = db.get_open_tickets()
+    view = await get_tickets_page_view(db, TicketStatus.OPEN, config.TICKETS_PAGE_SIZE)
 
-    if not open_tickets:
-        await message.answer("🎉 Нет новых открытых заявок!")
+    if not view:
+        await message.answer(TICKETS_PAGE_VIEWS[TicketStatus.OPEN][2])
         return
 
-    await message.answer(f"🟢 Новые заявки: {len(open_tickets)}")
-
-    for ticket in open_tickets:
-        ticket_info = (
-            f"🟢 Новая заявка #{ticket['id']}\n\n"
-            f"👤 ФИО: {ticket['full_name']}\n"
-            f"🚪 Кабинет: {ticket['room']}\n"
-            f"📅 Создана: {ticket['created_at']}\n\n"
-            f"📝 Проблема:\n{ticket['problem'][:100]}{'...' if len(ticket['problem']) > 100 else ''}"
-        )
-
-        keyboard = get_ticket_action_keyboard(ticket['id'], ticket['user_id'])
-
-        await message.answer(
-            ticket_info,
-            reply_markup=keyboard
-        )
+    text, keyboard = view
+    await message.answer(text, reply_markup=keyboard)
 
 
 # Команда для вывода заявок в работе
 @admin_router.message(Command("in_progress"))
 @admin_router.message(F.text == "🟡 В работе")
-async def show_in_progress_tickets(message: Message, db: Database, config: Config):
+async def show_in_progress_tickets(message: Message, db: AsyncDatabase, config: Config):
     if message.from_user.id not in config.ADMIN_IDS:
         await message.answer("❌ Эта команда только для администраторов!")
         return
 
-    in_progress_tickets = db.get_in_progress_tickets()
+    view = await get_tickets_page_view(db, TicketStatus.IN_PROGRESS, config.TICKETS_PAGE_SIZE)
 
-    if not in_progress_tickets:
-        await message.answer("📊 Нет заявок в работе.")
+    if not view:
+        await message.answer(TICKETS_PAGE_VIEWS[TicketStatus.IN_PROGRESS][2])
         return
 
-    await message.answer(f"🟡 Заявки в работе: {len(in_progress_tickets)}")
+    text, keyboard = view
+    await message.answer(text, reply_markup=keyboard)
 
-    for ticket in in_progress_tickets:
-        ticket_info = (
-            f"🟡 В работе ##{ticket['id']}\n\n"
-            f"👤 ФИО: {ticket['full_name']}\n"
-            f"🚪 Кабинет: {ticket['room']}\n"
-            f"📅 Создана: {ticket['created_at']}\n\n"
-            f"📝 Проблема:\n{ticket['problem'][:100]}{'...' if len(ticket['problem']) > 100 else ''}"
-        )
 
-        keyboard = get_in_progress_ticket_keyboard(ticket['id'], ticket['user_id'])
+# Навигация по страницам списка заявок (сообщение редактируется на месте)
+@admin_router.callback_query(F.data.startswith("tickets_page_"))
+async def navigate_tickets_page(callback: CallbackQuery, db: AsyncDatabase, config: Config):
+    if callback.from_user.id not in config.ADMIN_IDS:
+        await callback.answer("❌ Только для администраторов!", show_alert=True)
+        return
+
+    # Формат: tickets_page_<status>_<prev|next>_<id>
+    prefix, direction, ticket_id = callback.data.rsplit("_", 2)
+    status = TicketStatus(prefix[len("tickets_page_"):])
+    ticket_id = int(ticket_id)
 
-        await message.answer(
-            ticket_info,
-            reply_markup=keyboard
+    view = await get_tickets_page_view(
+        db, status, config.TICKETS_PAGE_SIZE,
+        after_id=ticket_id if direction == "next" else None,
+        before_id=ticket_id if direction == "prev" else None
+    )
+
+    if not view:
+        await callback.message.edit_text(TICKETS_PAGE_VIEWS[status][2], reply_markup=None)
+        await callback.answer()
+        return
+
+    text, keyboard = view
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except TelegramBadRequest:
+        # Содержимое страницы не изменилось
+        pass
+    await callback.answer()
+
+
+# Карточка заявки из постраничного списка
+@admin_router.callback_query(F.data.startswith("show_ticket_"))
+async def show_ticket_card(callback: CallbackQuery, db: AsyncDatabase, config: Config):
+    if callback.from_user.id not in config.ADMIN_IDS:
+        await callback.answer("❌ Только для администраторов!", show_alert=True)
+        return
+
+    ticket_id = int(callback.data.split("_")[2])
+    ticket = await db.get_ticket(ticket_id)
+
+    if not ticket:
+        await callback.answer("❌ Заявка не найдена!", show_alert=True)
+        return
+
+    if ticket.status == TicketStatus.OPEN:
+        keyboard = get_ticket_action_keyboard(ticket.id, ticket.user_id)
+    elif ticket.status == TicketStatus.IN_PROGRESS:
+        keyboard = get_in_progress_ticket_keyboard(ticket.id, ticket.user_id)
+    else:
+        keyboard = None
+
+    await callback.message.answer(format_ticket_message(ticket), reply_markup=keyboard)
+    await callback.answer()
+
+
+# Поиск по заявкам
+STATUS_EMOJI = {
+    TicketStatus.OPEN.value: "🟢",
+    TicketStatus.IN_PROGRESS.value: "🟡",
+    TicketStatus.CLOSED.value: "🔴",
+}
+
+
+async def get_search_view(db: AsyncDatabase, query: str, page_size: int, offset: int = 0):
+    """Страница результатов поиска; возвращает текст и клавиатуру или None, если ничего не найдено"""
+    result = await db.search_tickets(query, limit=page_size, offset=offset)
+    if not result['tickets']:
+        return None
+
+    lines = [f"🔎 Поиск: {query[:100]}\nРезультаты {offset + 1}-{offset + len(result['tickets'])}\n"]
+    for ticket in result['tickets']:
+        lines.append(
+            f"{STATUS_EMOJI.get(ticket['status'], '⚪')} #{ticket['id']} | 🚪 {ticket['room']} | 📅 {ticket['created_at']}\n"
+            f"👤 {ticket['full_name']}{BLOCKED_MARK if ticket['user_blocked'] else ''}\n"
+            f"📝 {ticket['snippet']}\n"
         )
 
+    keyboard = get_search_results_keyboard(result['tickets'], offset, page_size, result['has_next'])
+    return "\n".join(lines), keyboard
+
+
+@admin_router.message(Command("search"))
+async def search_tickets_command(message: Message, state: FSMContext, db: AsyncDatabase, config: Config):
+    if message.from_user.id not in config.ADMIN_IDS:
+        await message.answer("❌ Эта команда только для администраторов!")
+        return
+
+    # Парсим команду: /search принтер 305
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2 or not parts[1].strip():
+        await message.answer("❌ Использование: /search <текст>")
+        return
+
+    query = parts[1].strip()
+    view = await get_search_view(db, query, config.TICKETS_PAGE_SIZE)
+
+    if not view:
+        await message.answer(f"🔎 По запросу «{query}» ничего не найдено.")
+        return
+
+    # Запрос сохраняем для навигации по страницам
+    await state.update_data(search_query=query)
+
+    text, keyboard = view
+    await message.answer(text, reply_markup=keyboard)
+
+
+@admin_router.callback_query(F.data.startswith("search_page_"))
+async def navigate_search_page(callback: CallbackQuery, state: FSMContext, db: AsyncDatabase, config: Config):
+    if callback.from_user.id not in config.ADMIN_IDS:
+        await callback.answer("❌ Только для администраторов!", show_alert=True)
+        return
+
+    data = await state.get_data()
+    query = data.get('search_query')
+    if not query:
+        await callback.answer("❌ Поиск устарел, выполните /search заново", show_alert=True)
+        return
+
+    offset = int(callback.data.split("_")[2])
+    view = await get_search_view(db, query, config.TICKETS_PAGE_SIZE, offset)
+
+    if not view:
+        await callback.answer("🔎 Больше результатов нет")
+        return
+
+    text, keyboard = view
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard)
+    except TelegramBadRequest:
+        # Содержимое страницы не изменилось
+        pass
+    await callback.answer()
+
 
 # Блокировка пользователя
 @admin_router.callback_query(F.data.startswith("block_"))
-async def block_user_start(callback: CallbackQuery, state: FSMContext, blocked_db: BlockedDatabase):
+async def block_user_start(callback: CallbackQuery, state: FSMContext, blocked_db: AsyncBlockedDatabase):
     parts = callback.data.split("_")
     user_id = int(parts[1])
     ticket_id = int(parts[2])
 
     # Проверяем, не заблокирован ли уже пользователь
-    if blocked_db.is_user_blocked(user_id):
+    if await blocked_db.is_user_blocked(user_id):
         await callback.answer("❌ Пользователь уже заблокирован!")
         return
 
@@ -290,7 +456,7 @@ async def block_user_start(callback: CallbackQuery, state: FSMContext, blocked_d
 
 
 @admin_router.message(BlockUserForm.waiting_for_reason)
-async def process_block_reason(message: Message, state: FSMContext, blocked_db: BlockedDatabase, bot: Bot):
+async def process_block_reason(message: Message, state: FSMContext, blocked_db: AsyncBlockedDatabase, bot: Bot):
     data = await state.get_data()
     user_id = data['user_id']
     reason = message.text
@@ -299,7 +465,7 @@ async def process_block_reason(message: Message, state: FSMContext, blocked_db:
     user_info = await safe_get_user_info(bot, user_id)
 
     # Блокируем пользователя
-    success = blocked_db.block_user(
+    success = await blocked_db.block_user(
         user_id=user_id,
         blocked_by=message.from_user.id,
         username=user_info.get('username') if user_info else None,
@@ -310,15 +476,13 @@ async def process_block_reason(message: Message, state: FSMContext, blocked_db:
 
     if success:
         # Отправляем уведомление пользователю
-        try:
-            await bot.send_message(
-                user_id,
-                f"🚫 Вы были заблокированы в системе технической поддержки\n\n"
-                f"📋 Причина: {reason}\n\n"
-                f"❌ Вы больше не можете создавать новые заявки."
-            )
-        except:
-            pass
+        await notify_user(
+            bot,
+            user_id,
+            f"🚫 Вы были заблокированы в системе технической поддержки\n\n"
+            f"📋 Причина: {reason}\n\n"
+            f"❌ Вы больше не можете создавать новые заявки."
+        )
 
         await message.answer(
             f"✅ Пользователь ID: {user_id} успешно заблокирован!\n"
@@ -332,10 +496,10 @@ async def process_block_reason(message: Message, state: FSMContext, blocked_db:
 
 # Разблокировка пользователя
 @admin_router.callback_query(F.data.startswith("unblock_"))
-async def unblock_user(callback: CallbackQuery, blocked_db: BlockedDatabase):
+async def unblock_user(callback: CallbackQuery, blocked_db: AsyncBlockedDatabase):
     user_id = int(callback.data.split("_")[1])
 
-    success = blocked_db.unblock_user(user_id)
+    success = await blocked_db.unblock_user(user_id)
 
     if success:
         await callback.message.edit_text(
@@ -354,12 +518,12 @@ async def unblock_user(callback: CallbackQuery, blocked_db: BlockedDatabase):
 # Команда для статистики
 @admin_router.message(Command("stats"))
 @admin_router.message(F.text == "📊 Статистика")
-async def show_stats(message: Message, db: Database, config: Config):
+async def show_stats(message: Message, db: AsyncDatabase, config: Config):
     if message.from_user.id not in config.ADMIN_IDS:
         await message.answer("❌ Эта команда только для администраторов!")
         return
 
-    stats = db.get_tickets_stats()
+    stats = await db.get_tickets_stats()
 
     stats_text = (
         "📊 Статистика заявок\n\n"
@@ -373,17 +537,59 @@ async def show_stats(message: Message, db: Database, config: Config):
     await message.answer(stats_text)
 
 
+# Команда для просмотра профиля запросов к базе
+@admin_router.message(Command("db_profile"))
+async def show_db_profile(message: Message, db: AsyncDatabase, config: Config):
+    if message.from_user.id not in config.ADMIN_IDS:
+        await message.answer("❌ Эта команда только для администраторов!")
+        return
+
+    # Парсим команду: /db_profile [total|avg|max|reset]
+    parts = message.text.split()
+    order_by = parts[1].lower() if len(parts) > 1 else 'total'
+
+    if order_by == 'reset':
+        db.reset_query_stats()
+        await message.answer("✅ Статистика запросов сброшена.")
+        return
+    if order_by not in ('total', 'avg', 'max'):
+        await message.answer("❌ Использование: /db_profile [total|avg|max|reset]")
+        return
+
+    stats = db.get_query_stats(config.DB_PROFILE_TOP, order_by)
+    if stats is None:
+        await message.answer("ℹ️ Профилирование запросов выключено (DB_PROFILE=true).")
+        return
+    if not stats['statements']:
+        await message.answer("📊 Запросов пока не было.")
+        return
+
+    lines = [f"🐢 Медленных запросов: {stats['slow_queries']}\n", "📊 Запросы:"]
+    for index, stat in enumerate(stats['statements'], 1):
+        lines.append(
+            f"{index}. {stat['count']} шт. | всего {stat['total_ms']} мс | "
+            f"ср. {stat['avg_ms']} мс | макс. {stat['max_ms']} мс\n{stat['sql'][:200]}"
+        )
+    lines.append("\n⏱ Методы:")
+    for stat in stats['methods']:
+        lines.append(f"{stat['method']}: {stat['count']} шт. | всего {stat['total_ms']} мс | "
+                     f"макс. {stat['max_ms']} мс")
+
+    # Ограничение длины сообщения Telegram
+    await message.answer("\n".join(lines)[:4000])
+
+
 # Команда для просмотра оценок
 @admin_router.message(Command("ratings"))
 @admin_router.message(F.text == "⭐ Оценки")
-async def show_ratings(message: Message, db: Database, config: Config):
+async def show_ratings(message: Message, db: AsyncDatabase, config: Config):
     if message.from_user.id not in config.ADMIN_IDS:
         await message.answer("❌ Эта команда только для администраторов!")
         return
 
     # Получаем статистику оценок
-    rating_stats = db.get_rating_stats()
-    rated_tickets = db.get_rated_tickets(10)
+    rating_stats = await db.get_rating_stats()
+    rated_tickets = await db.get_rated_tickets(10)
 
     if not rated_tickets:
         await message.answer("⭐ Пока нет оценок от пользователей.")
@@ -411,7 +617,7 @@ async def show_ratings(message: Message, db: Database, config: Config):
         rating_stars = "⭐" * ticket['rating']
         rating_text = (
             f"⭐ Заявка #{ticket['id']}\n"
-            f"👤 {ticket['full_name']} | 🚪 {ticket['room']}\n"
+            f"👤 {ticket['full_name']}{BLOCKED_MARK if ticket['user_blocked'] else ''} | 🚪 {ticket['room']}\n"
             f"🎯 Оценка: {rating_stars} ({ticket['rating']}/5)\n"
             f"👨‍💼 Исполнитель: {ticket['closed_by'] or 'Не указан'}\n"
         )
@@ -422,15 +628,63 @@ async def show_ratings(message: Message, db: Database, config: Config):
         await message.answer(rating_text)
 
 
+# Выгрузка истории заявок
+@admin_router.message(Command("export"))
+async def export_tickets_command(message: Message, db: AsyncDatabase, config: Config):
+    if message.from_user.id not in config.ADMIN_IDS:
+        await message.answer("❌ Эта команда только для администраторов!")
+        return
+
+    # Парсим команду: /export [csv|jsonl] [open|in_progress|closed] [с YYYY-MM-DD] [по YYYY-MM-DD]
+    fmt = "csv"
+    status = None
+    dates = []
+    try:
+        for arg in message.text.split()[1:]:
+            if arg in EXPORT_FORMATS:
+                fmt = arg
+            elif arg in [ticket_status.value for ticket_status in TicketStatus]:
+                status = TicketStatus(arg)
+            else:
+                dates.append(parse_date(arg))
+        if len(dates) > 2:
+            raise ValueError
+    except ValueError:
+        await message.answer(
+            "❌ Использование: /export [csv|jsonl] [open|in_progress|closed] [с ГГГГ-ММ-ДД] [по ГГГГ-ММ-ДД]"
+        )
+        return
+
+    date_from = dates[0] if dates else None
+    date_to = dates[1] if len(dates) > 1 else None
+
+    await message.answer("⏳ Готовим выгрузку заявок...")
+
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}.gz")
+    os.close(fd)
+    try:
+        count = await db.export_tickets(path, fmt, status, date_from, date_to)
+        filename = f"tickets_{datetime.now().strftime('%Y%m%d_%H%M')}.{fmt}.gz"
+        await message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=f"📦 Выгружено заявок: {count}"
+        )
+    except Exception as e:
+        logging.error(f"Ошибка выгрузки заявок: {e}")
+        await message.answer("❌ Ошибка при выгрузке заявок!")
+    finally:
+        os.remove(path)
+
+
 # Показать заблокированных пользователей
 @admin_router.message(Command("blocked"))
 @admin_router.message(F.text == "🚫 Заблокированные")
-async def show_blocked_users_command(message: Message, blocked_db: BlockedDatabase, config: Config):
+async def show_blocked_users_command(message: Message, blocked_db: AsyncBlockedDatabase, config: Config):
     if message.from_user.id not in config.ADMIN_IDS:
         await message.answer("❌ Эта команда только для администраторов!")
         return
 
-    blocked_users = blocked_db.get_blocked_users()
+    blocked_users = await blocked_db.get_blocked_users()
 
     if not blocked_users:
         await message.answer("🚫 Нет заблокированных пользователей.")
@@ -463,7 +717,7 @@ async def show_blocked_users_command(message: Message, blocked_db: BlockedDataba
 
 # Команда для разблокировки пользователя
 @admin_router.message(Command("unblock"))
-async def unblock_user_command(message: Message, blocked_db: BlockedDatabase, config: Config):
+async def unblock_user_command(message: Message, blocked_db: AsyncBlockedDatabase, config: Config):
     if message.from_user.id not in config.ADMIN_IDS:
         await message.answer("❌ Эта команда только для администраторов!")
         return
@@ -476,25 +730,23 @@ async def unblock_user_command(message: Message, blocked_db: BlockedDatabase, co
         return
 
     # Проверяем, заблокирован ли пользователь
-    if not blocked_db.is_user_blocked(user_id):
+    if not await blocked_db.is_user_blocked(user_id):
         await message.answer(f"❌ Пользователь {user_id} не заблокирован!")
         return
 
     # Разблокируем
-    success = blocked_db.unblock_user(user_id)
+    success = await blocked_db.unblock_user(user_id)
 
     if success:
         await message.answer(f"✅ Пользователь {user_id} успешно разблокирован!")
 
         # Пытаемся уведомить пользователя
-        try:
-            await message.bot.send_message(
-                user_id,
-                "✅ Ваша блокировка снята\n\n"
-                "Вы снова можете создавать заявки в системе технической поддержки."
-            )
-        except:
-            pass
+        await notify_user(
+            message.bot,
+            user_id,
+            "✅ Ваша блокировка снята\n\n"
+            "Вы снова можете создавать заявки в системе технической поддержки."
+        )
     else:
         await message.answer("❌ Ошибка при разблокировке пользователя!")
 
@@ -513,9 +765,12 @@ async def admin_help(message: Message, config: Config):
         "🟢 /open_tickets - новые заявки\n"
         "🟡 /in_progress - заявки в работе\n"
         "🟡 /take_to_work <номер> - взять заявку в работу\n"
+        "🔎 /search <текст> - поиск по заявкам\n"
         "🚫 /blocked - список заблокированных\n"
         "🔓 /unblock <ID> - разблокировать пользователя\n"
         "📊 /stats - статистика заявок\n"
+        "🐢 /db_profile [total|avg|max|reset] - профиль запросов к базе\n"
+        "📦 /export [csv|jsonl] [статус] [с] [по] - выгрузка заявок\n"
         "⭐ /ratings - оценки пользователей\n\n"
         "Процесс работы:\n"
         "1. 🟢 Новая заявка → /take_to_work\n"
@@ -3,10 +3,12 @@ from aiogram.types import Message, CallbackQuery, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from database import Database
+from async_database import AsyncDatabase
 from keyboards import get_rating_keyboard, get_feedback_keyboard, get_main_keyboard
 from config import Config
-from utils import notify_user
+from utils import enqueue_message
+from message_scheduler import SendPriority
+from structured_logging import bind_ticket
 
 
 class RatingForm(StatesGroup):
@@ -17,9 +19,10 @@ rating_router = Router()
 
 
 @rating_router.callback_query(F.data.startswith("rate_"))
-async def process_rating(callback: CallbackQuery, state: FSMContext, db: Database, bot: Bot, config: Config):
+async def process_rating(callback: CallbackQuery, state: FSMContext, db: AsyncDatabase, bot: Bot, config: Config):
     parts = callback.data.split("_")
     ticket_id = int(parts[1])
+    bind_ticket(ticket_id)
     rating_action = parts[2]
 
     # Удаляем кнопки оценки сразу после нажатия
@@ -33,10 +36,10 @@ async def process_rating(callback: CallbackQuery, state: FSMContext, db: Databas
     rating = int(rating_action)
 
     # Сохраняем оценку
-    db.update_ticket_rating(ticket_id, rating)
+    await db.update_ticket_rating(ticket_id, rating)
 
     # Получаем информацию о заявке
-    ticket = db.get_ticket(ticket_id)
+    ticket = await db.get_ticket(ticket_id)
 
     if ticket:
         # Отправляем уведомление в чат администрации
@@ -50,9 +53,11 @@ async def process_rating(callback: CallbackQuery, state: FSMContext, db: Databas
             f"📝 Проблема:\n{ticket.problem[:100]}..."
         )
 
-        await bot.send_message(
+        enqueue_message(
+            bot=bot,
             chat_id=config.SUPPORT_CHAT_ID,
-            text=rating_info
+            text=rating_info,
+            priority=SendPriority.DIGEST
         )
 
     # Переходим к сбору отзыва
@@ -106,17 +111,18 @@ async def cancel_feedback(message: Message, state: FSMContext):
 
 
 @rating_router.message(RatingForm.waiting_for_feedback)
-async def process_feedback(message: Message, state: FSMContext, db: Database, bot: Bot, config: Config):
+async def process_feedback(message: Message, state: FSMContext, db: AsyncDatabase, bot: Bot, config: Config):
     data = await state.get_data()
     ticket_id = data['ticket_id']
     rating = data['rating']
     feedback = message.text
+    bind_ticket(ticket_id)
 
     # Сохраняем отзыв
-    db.update_ticket_rating(ticket_id, rating, feedback)
+    await db.update_ticket_rating(ticket_id, rating, feedback)
 
     # Получаем информацию о заявке
-    ticket = db.get_ticket(ticket_id)
+    ticket = await db.get_ticket(ticket_id)
 
     if ticket:
         # Отправляем полный отзыв в чат администрации
@@ -131,9 +137,11 @@ async def process_feedback(message: Message, state: FSMContext, db: Database, bo
             f"📝 Проблема была:\n{ticket.problem[:100]}..."
         )
 
-        await bot.send_message(
+        enqueue_message(
+            bot=bot,
             chat_id=config.SUPPORT_CHAT_ID,
-            text=rating_info
+            text=rating_info,
+            priority=SendPriority.DIGEST
         )
 
     # Удаляем клавиатуру отзыва
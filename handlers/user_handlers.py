@@ -3,11 +3,12 @@ from aiogram.types import Message, ReplyKeyboardRemove
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
-from database import Database
-from blocked_database import BlockedDatabase
+from async_database import AsyncDatabase, AsyncBlockedDatabase
 from keyboards import get_main_keyboard, get_cancel_keyboard, get_rating_keyboard
 from config import Config
-from utils import safe_send_message
+from utils import enqueue_message
+from message_scheduler import SendPriority
+from structured_logging import bind_ticket
 import logging
 
 
@@ -30,9 +31,9 @@ async def cancel_handler(message: Message, state: FSMContext):
 
 
 @user_router.message(F.text == "📋 Создать заявку")
-async def create_ticket_start(message: Message, state: FSMContext, blocked_db: BlockedDatabase):
+async def create_ticket_start(message: Message, state: FSMContext, blocked_db: AsyncBlockedDatabase):
     # Проверяем, не заблокирован ли пользователь
-    if blocked_db.is_user_blocked(message.from_user.id):
+    if await blocked_db.is_user_blocked(message.from_user.id):
         await message.answer(
             "🚫 Вы заблокированы в системе технической поддержки\n\n"
             "❌ Вы не можете создавать новые заявки.\n"
@@ -63,18 +64,19 @@ async def process_room(message: Message, state: FSMContext):
 
 
 @user_router.message(TicketForm.problem)
-async def process_problem(message: Message, state: FSMContext, db: Database, config: Config, bot: Bot):
+async def process_problem(message: Message, state: FSMContext, db: AsyncDatabase, config: Config, bot: Bot):
     data = await state.get_data()
 
     # Логируем создание заявки
     logging.info(f"Создание заявки от пользователя {message.from_user.id}")
 
-    ticket_id = db.add_ticket(
+    ticket_id = await db.add_ticket(
         user_id=message.from_user.id,
         full_name=data['full_name'],
         room=data['room'],
         problem=message.text
     )
+    bind_ticket(ticket_id)
 
     logging.info(f"Заявка #{ticket_id} создана в базе данных")
 
@@ -90,39 +92,46 @@ async def process_problem(message: Message, state: FSMContext, db: Database, con
     from keyboards import get_ticket_action_keyboard
     keyboard = get_ticket_action_keyboard(ticket_id, message.from_user.id)
 
-    success = await safe_send_message(
+    # Уведомление ставится в очередь без ожидания: лимит группы (20 сообщ./мин) не должен
+    # задерживать подтверждение пользователю; о сбое доставки пользователь узнает отдельно
+    delivery = enqueue_message(
         bot=bot,
         chat_id=config.SUPPORT_CHAT_ID,
         text=ticket_info,
+        priority=SendPriority.SUPPORT,
         reply_markup=keyboard
     )
+    delivery.add_done_callback(_warn_on_support_failure(bot, message.from_user.id, ticket_id))
 
     await state.clear()
 
-    if success:
-        await message.answer(
-            f"🟢 Ваша заявка #{ticket_id} создана!\n\n"
-            "Ожидайте, когда технический специалист возьмёт её в работу.\n"
-            "Вы получите уведомление о начале работы над вашей заявкой.",
-            reply_markup=get_main_keyboard()
-        )
-    else:
-        await message.answer(
-            f"✅ Ваша заявка #{ticket_id} создана!\n"
-            "⚠️ Внимание: Возникли проблемы с уведомлением технических специалистов.",
-            reply_markup=get_main_keyboard()
-        )
+    await message.answer(
+        f"🟢 Ваша заявка #{ticket_id} создана!\n\n"
+        "Ожидайте, когда технический специалист возьмёт её в работу.\n"
+        "Вы получите уведомление о начале работы над вашей заявкой.",
+        reply_markup=get_main_keyboard()
+    )
 
 
-@user_router.message(F.text == "📊 Мои заявки")
-async def show_my_tickets(message: Message, db: Database):
-    tickets = db.get_user_tickets(message.from_user.id)
+def _warn_on_support_failure(bot: Bot, user_id: int, ticket_id: int):
+    """Callback доставки в чат поддержки: при сбое предупреждает пользователя"""
+    def callback(future):
+        if future.cancelled() or future.exception():
+            enqueue_message(
+                bot=bot,
+                chat_id=user_id,
+                text=f"⚠️ Заявка #{ticket_id} создана, но возникли проблемы "
+                     "с уведомлением технических специалистов."
+            )
+    return callback
 
-    if not tickets:
-        await message.answer("У вас пока нет заявок.")
-        return
 
-    for ticket in tickets:
+@user_router.message(F.text == "📊 Мои заявки")
+async def show_my_tickets(message: Message, db: AsyncDatabase):
+    # Заявки читаются порциями по мере отправки, весь список в памяти не собирается
+    shown = 0
+    async for ticket in db.iter_user_tickets(message.from_user.id):
+        shown += 1
         status_emoji = "🟢" if ticket['status'] == "open" else "🟡" if ticket['status'] == "in_progress" else "🔴"
 
         # Форматируем дату
@@ -146,4 +155,7 @@ async def show_my_tickets(message: Message, db: Database):
             if ticket['feedback']:
                 ticket_text += f"📝 Отзыв:\n{ticket['feedback']}\n"
 
-        await message.answer(ticket_text)
\ No newline at end of file
+        await message.answer(ticket_text)
+
+    if not shown:
+        await message.answer("У вас пока нет заявок.")
\ No newline at end of file
@@ -97,4 +97,38 @@ def get_unblock_user_keyboard(user_id: int):
                 InlineKeyboardButton(text="🔓 Разблокировать", callback_data=f"unblock_{user_id}")
             ]
         ]
-    )
\ No newline at end of file
+    )
+
+def get_tickets_page_keyboard(status: str, tickets: list, has_prev: bool, has_next: bool):
+    """Клавиатура страницы заявок: кнопки заявок и навигация ◀/▶"""
+    rows = [
+        [InlineKeyboardButton(text=f"#{ticket['id']} 🚪 {ticket['room']}", callback_data=f"show_ticket_{ticket['id']}")]
+        for ticket in tickets
+    ]
+
+    navigation = []
+    if has_prev and tickets:
+        navigation.append(InlineKeyboardButton(text="◀", callback_data=f"tickets_page_{status}_prev_{tickets[0]['id']}"))
+    if has_next and tickets:
+        navigation.append(InlineKeyboardButton(text="▶", callback_data=f"tickets_page_{status}_next_{tickets[-1]['id']}"))
+    if navigation:
+        rows.append(navigation)
+
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def get_search_results_keyboard(tickets: list, offset: int, page_size: int, has_next: bool):
+    """Клавиатура результатов поиска: кнопки заявок и навигация ◀/▶"""
+    rows = [
+        [InlineKeyboardButton(text=f"#{ticket['id']} 🚪 {ticket['room']}", callback_data=f"show_ticket_{ticket['id']}")]
+        for ticket in tickets
+    ]
+
+    navigation = []
+    if offset > 0:
+        navigation.append(InlineKeyboardButton(text="◀", callback_data=f"search_page_{max(offset - page_size, 0)}"))
+    if has_next:
+        navigation.append(InlineKeyboardButton(text="▶", callback_data=f"search_page_{offset + page_size}"))
+    if navigation:
+        rows.append(navigation)
+
+    return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -1,60 +1,151 @@
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.fsm.storage.base import BaseStorage
 
-from config import load_config
+from config import Config, load_config
 from database import Database
 from blocked_database import BlockedDatabase
+from async_database import AsyncDatabase, AsyncBlockedDatabase
 from handlers import common_router, user_router, admin_router, rating_router
 from utils import setup_logging
+from message_scheduler import scheduler, SchedulerAccountingMiddleware
+from fsm_storage import SQLiteStorage
+from webhook import run_webhook
+from archiver import run_archiver
+from structured_logging import LogContextMiddleware
+from throttling import setup_throttling
+from metrics import setup_router_metrics, start_metrics_server, monitor_event_loop, track_scheduler, \
+    track_fsm_storage, track_ticket_cache, track_blocked_index, track_throttler, track_group_commit
+
+
+def create_dispatcher(storage: BaseStorage, db: AsyncDatabase, blocked_db: AsyncBlockedDatabase,
+                      config: Config) -> Dispatcher:
+    """Диспетчер с роутерами и зависимостями бота"""
+    dp = Dispatcher(storage=storage)
+    dp.update.outer_middleware(LogContextMiddleware())
+
+    # Включаем роутеры (с замером времени обработчиков для метрик)
+    routers = {"common": common_router, "user": user_router, "admin": admin_router, "rating": rating_router}
+    setup_router_metrics(routers)
+    if config.THROTTLE_ENABLED:
+        dp["throttler"] = setup_throttling(dp, routers, blocked_db, config)
+    for router in routers.values():
+        dp.include_router(router)
+
+    # Передаем зависимости
+    dp["db"] = db
+    dp["blocked_db"] = blocked_db
+    dp["config"] = config
+    return dp
 
 
 async def main():
+    config = load_config()
+
     # Настройка логирования
-    setup_logging()
+    log_listener = setup_logging(config)
     logging.info("Запуск бота технической поддержки...")
 
-    config = load_config()
-
     # Проверка токена
     if not config.BOT_TOKEN:
         logging.error("Токен бота не найден! Проверьте файл .env")
+        log_listener.stop()
         return
 
-    bot = Bot(token=config.BOT_TOKEN)
-    storage = MemoryStorage()
-    dp = Dispatcher(storage=storage)
+    session = None
+    if config.BOT_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.BOT_API_URL))
+        logging.info(f"Используется сервер Bot API: {config.BOT_API_URL}")
+    bot = Bot(token=config.BOT_TOKEN, session=session)
+    # Прямые ответы в группы учитываются в лимитах очереди отправки
+    bot.session.middleware(SchedulerAccountingMiddleware(scheduler))
+    storage = SQLiteStorage(
+        config.FSM_DB_NAME,
+        cache_size=config.FSM_CACHE_SIZE,
+        flush_interval=config.FSM_FLUSH_INTERVAL,
+        session_ttl=config.FSM_SESSION_TTL,
+        synchronous=config.DB_SYNCHRONOUS
+    )
 
-    # Инициализация баз данных
-    db = Database(config.DB_NAME)
-    blocked_db = BlockedDatabase("blocked_users.db")
+    # Инициализация баз данных (запросы выполняются в отдельных потоках).
+    # База блокировок создается первой: база заявок подключает ее через ATTACH
+    blocked_db = AsyncBlockedDatabase(BlockedDatabase(
+        config.BLOCKED_DB_NAME,
+        journal_mode=config.DB_JOURNAL_MODE,
+        synchronous=config.DB_SYNCHRONOUS,
+        busy_timeout=config.DB_BUSY_TIMEOUT
+    ))
+    db = AsyncDatabase(Database(
+        config.DB_NAME,
+        journal_mode=config.DB_JOURNAL_MODE,
+        synchronous=config.DB_SYNCHRONOUS,
+        busy_timeout=config.DB_BUSY_TIMEOUT,
+        read_pool_size=config.DB_READ_POOL_SIZE,
+        archive_db_name=config.ARCHIVE_DB_NAME or None,
+        blocked_db_name=config.BLOCKED_DB_NAME,
+        profile=config.DB_PROFILE,
+        slow_query_ms=config.DB_SLOW_QUERY_MS,
+        ticket_cache_size=config.TICKET_CACHE_SIZE if config.TICKET_CACHE_ENABLED else 0
+    ), group_commit_ms=config.DB_GROUP_COMMIT_MS, group_commit_max_ops=config.DB_GROUP_COMMIT_MAX_OPS)
 
-    # Включаем роутеры
-    dp.include_router(common_router)
-    dp.include_router(user_router)
-    dp.include_router(admin_router)
-    dp.include_router(rating_router)
+    dp = create_dispatcher(storage, db, blocked_db, config)
 
-    # Передаем зависимости
-    dp["db"] = db
-    dp["blocked_db"] = blocked_db
-    dp["config"] = config
+    # Очередь исходящих сообщений с ограничением скорости
+    scheduler.configure(
+        global_rate=config.SEND_GLOBAL_RATE,
+        private_rate=config.SEND_PRIVATE_RATE,
+        group_rate_per_minute=config.SEND_GROUP_RATE_PER_MINUTE,
+        workers=config.SEND_WORKERS,
+        group_reserve=config.SEND_GROUP_RESERVE
+    )
 
+    archiver_task = None
+    metrics_runner = None
+    loop_monitor_task = None
     try:
-        await bot.delete_webhook(drop_pending_updates=True)
+        await scheduler.start()
+        if config.METRICS_PORT:
+            track_scheduler(scheduler)
+            track_fsm_storage(storage)
+            track_ticket_cache(db)
+            track_blocked_index(blocked_db)
+            if dp.get("throttler"):
+                track_throttler(dp["throttler"])
+            if config.DB_GROUP_COMMIT_MS:
+                track_group_commit(db)
+            metrics_runner = await start_metrics_server(config.METRICS_HOST, config.METRICS_PORT)
+            loop_monitor_task = asyncio.create_task(monitor_event_loop())
+        if config.ARCHIVE_DB_NAME:
+            archiver_task = asyncio.create_task(run_archiver(
+                db, config.ARCHIVE_INTERVAL, config.ARCHIVE_AFTER_DAYS, config.ARCHIVE_BATCH_SIZE
+            ))
         logging.info("Бот запущен успешно!")
         logging.info(f"ID чата поддержки: {config.SUPPORT_CHAT_ID}")
         logging.info(f"Администраторы: {config.ADMIN_IDS}")
 
-        await dp.start_polling(bot)
+        if config.BOT_MODE == "webhook":
+            await run_webhook(bot, dp, config)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            await dp.start_polling(bot)
     except Exception as e:
         logging.error(f"Ошибка при запуске бота: {e}")
     finally:
+        for task in (archiver_task, loop_monitor_task):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await scheduler.stop()
         await bot.session.close()
-        db.close()
+        await db.close()
         blocked_db.close()
         logging.info("Бот остановлен")
+        log_listener.stop()
 
 
 if __name__ == "__main__":
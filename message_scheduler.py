@@ -0,0 +1,290 @@
+import asyncio
+import contextvars
+import itertools
+import logging
+import time
+from enum import IntEnum
+from typing import Dict, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+
+# Запрос отправлен обработчиком очереди (а не напрямую из обработчика события)
+_scheduled_send: contextvars.ContextVar[bool] = contextvars.ContextVar("scheduled_send", default=False)
+
+
+class SendPriority(IntEnum):
+    """Классы приоритета исходящих сообщений (меньшее значение отправляется раньше)"""
+    USER = 0      # ответы и уведомления пользователям
+    SUPPORT = 1   # новые заявки в чат поддержки
+    DIGEST = 2    # оценки, отзывы и прочие сводки для администраторов
+
+
+class TokenBucket:
+    """Корзина токенов с резервированием: reserve() возвращает задержку до отправки"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, keep: float = 0) -> float:
+        """Резервирование токена; возвращает время ожидания в секундах
+
+        keep - сколько токенов оставить в корзине для прямых отправок (account)
+        """
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= keep:
+            return 0.0
+        return (keep - self.tokens) / self.rate
+
+    def pause(self, delay: float):
+        """Запрет отправки на delay секунд (после RetryAfter)"""
+        self._refill()
+        self.tokens = min(self.tokens, -delay * self.rate)
+
+    def is_idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class _SendJob:
+    __slots__ = ('bot', 'chat_id', 'text', 'kwargs', 'priority', 'future', 'attempts', 'chat_reserved')
+
+    def __init__(self, bot: Bot, chat_id: int, text: str, kwargs: dict, priority: SendPriority,
+                 future: asyncio.Future):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+        self.chat_reserved = False
+
+
+class MessageScheduler:
+    """Очередь исходящих сообщений с ограничением скорости (глобально и по чатам)"""
+
+    def __init__(self, global_rate: float = 30, private_rate: float = 1, group_rate_per_minute: float = 20,
+                 chat_burst: int = 3, workers: int = 8, max_retries: int = 3, group_reserve: float = 1):
+        self.configure(global_rate, private_rate, group_rate_per_minute, chat_burst, workers, max_retries,
+                       group_reserve)
+
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._workers = []
+        self._seq = itertools.count()
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+
+        # Метрики
+        self.pending = {priority: 0 for priority in SendPriority}
+        self.delayed = 0
+        self.sent = 0
+        self.failed = 0
+        self.direct = 0
+        self.retry_after_count = 0
+        self.retry_after_seconds = 0.0
+
+    def configure(self, global_rate: float = 30, private_rate: float = 1, group_rate_per_minute: float = 20,
+                  chat_burst: int = 3, workers: int = 8, max_retries: int = 3, group_reserve: float = 1):
+        """Настройка лимитов (до вызова start)
+
+        group_reserve - токены корзины группы, которые очередь не расходует: их получают
+        ответы обработчиков в группе (message.answer, edit_text), идущие мимо очереди.
+        """
+        self.global_rate = global_rate
+        self.private_rate = private_rate
+        self.group_rate = group_rate_per_minute / 60
+        self.chat_burst = chat_burst
+        self.group_reserve = min(group_reserve, max(chat_burst - 1, 0))
+        self.workers_count = workers
+        self.max_retries = max_retries
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    async def start(self):
+        """Запуск обработчиков очереди"""
+        if self.running:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+        logging.info(f"Очередь отправки запущена: {self.global_rate} сообщ./с, обработчиков: {self.workers_count}")
+
+    async def stop(self):
+        """Остановка обработчиков; неотправленные сообщения отменяются"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        while self._queue and not self._queue.empty():
+            _, _, job = self._queue.get_nowait()
+            job.future.cancel()
+        logging.info("Очередь отправки остановлена")
+
+    def submit(self, bot: Bot, chat_id: int, text: str,
+               priority: SendPriority = SendPriority.USER, **kwargs) -> asyncio.Future:
+        """Постановка сообщения в очередь без ожидания отправки
+
+        Возвращает future с результатом bot.send_message; ошибку отправки из него должен
+        забрать вызывающий (см. utils.enqueue_message).
+        """
+        if not self.running:
+            return asyncio.ensure_future(bot.send_message(chat_id, text, **kwargs))
+
+        future = asyncio.get_running_loop().create_future()
+        job = _SendJob(bot, chat_id, text, kwargs, priority, future)
+        self.pending[priority] += 1
+        future.add_done_callback(lambda _: self._done(priority))
+        self._queue.put_nowait((priority, next(self._seq), job))
+        return future
+
+    async def send_message(self, bot: Bot, chat_id: int, text: str,
+                           priority: SendPriority = SendPriority.USER, **kwargs):
+        """Постановка сообщения в очередь; возвращает результат bot.send_message"""
+        return await self.submit(bot, chat_id, text, priority=priority, **kwargs)
+
+    def account(self, chat_id: int):
+        """Учет сообщения, отправленного мимо очереди, в лимитах чата и глобальном"""
+        self.direct += 1
+        self._chat_bucket(chat_id).reserve()
+        self._global_bucket.reserve()
+
+    def _done(self, priority: SendPriority):
+        self.pending[priority] -= 1
+
+    def get_metrics(self) -> Dict:
+        """Метрики очереди отправки"""
+        return {
+            'queue_depth': self._queue.qsize() if self._queue else 0,
+            'pending': {priority.name.lower(): count for priority, count in self.pending.items()},
+            'delayed': self.delayed,
+            'sent': self.sent,
+            'failed': self.failed,
+            'direct': self.direct,
+            'retry_after_count': self.retry_after_count,
+            'retry_after_seconds': self.retry_after_seconds,
+            'chat_buckets': len(self._chat_buckets)
+        }
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) > 10000:
+                self._prune_buckets()
+            # Отрицательный ID - группа или канал
+            rate = self.group_rate if chat_id < 0 else self.private_rate
+            bucket = TokenBucket(rate, self.chat_burst)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_buckets(self):
+        """Удаление корзин неактивных чатов"""
+        for chat_id in [chat_id for chat_id, bucket in self._chat_buckets.items() if bucket.is_idle()]:
+            del self._chat_buckets[chat_id]
+
+    def _delay(self, delay: float, job: _SendJob):
+        """Повторная постановка задания в очередь через delay секунд"""
+        self.delayed += 1
+        asyncio.get_running_loop().call_later(delay, self._requeue, job)
+
+    def _requeue(self, job: _SendJob):
+        self.delayed -= 1
+        if not self.running:
+            job.future.cancel()
+            return
+        self._queue.put_nowait((job.priority, next(self._seq), job))
+
+    async def _worker(self):
+        while True:
+            _, _, job = await self._queue.get()
+            try:
+                if job.future.done():
+                    continue
+
+                # Лимит чата: не блокируем обработчик, а откладываем задание
+                if not job.chat_reserved:
+                    keep = self.group_reserve if job.chat_id < 0 else 0
+                    delay = self._chat_bucket(job.chat_id).reserve(keep)
+                    if delay > 0:
+                        job.chat_reserved = True
+                        self._delay(delay, job)
+                        continue
+                job.chat_reserved = False
+
+                delay = self._global_bucket.reserve()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                await self._deliver(job)
+            except asyncio.CancelledError:
+                job.future.cancel()
+                raise
+            except Exception as e:
+                logging.error(f"Ошибка обработки очереди отправки: {e}")
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, job: _SendJob):
+        token = _scheduled_send.set(True)
+        try:
+            result = await job.bot.send_message(job.chat_id, job.text, **job.kwargs)
+        except TelegramRetryAfter as e:
+            job.attempts += 1
+            self.retry_after_count += 1
+            self.retry_after_seconds += e.retry_after
+            logging.warning(f"RetryAfter {e.retry_after} с для чата {job.chat_id} (попытка {job.attempts})")
+
+            if job.attempts > self.max_retries:
+                self.failed += 1
+                job.future.set_exception(e)
+                return
+
+            self._chat_bucket(job.chat_id).pause(e.retry_after)
+            job.chat_reserved = True
+            self._delay(e.retry_after, job)
+            return
+        except Exception as e:
+            self.failed += 1
+            job.future.set_exception(e)
+            return
+        finally:
+            _scheduled_send.reset(token)
+
+        self.sent += 1
+        job.future.set_result(result)
+
+
+class SchedulerAccountingMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: отправки в группы мимо очереди учитываются в ее лимитах
+
+    Ответы обработчиков (message.answer, edit_text) в чате поддержки не ждут очереди,
+    но расходуют тот же лимит группы, поэтому очередь должна о них знать.
+    """
+
+    def __init__(self, scheduler: MessageScheduler):
+        self.scheduler = scheduler
+
+    async def __call__(self, make_request, bot: Bot, method):
+        chat_id = getattr(method, "chat_id", None)
+        if (self.scheduler.running and not _scheduled_send.get() and isinstance(chat_id, int) and chat_id < 0
+                and type(method).__name__.startswith(("Send", "Edit"))):
+            self.scheduler.account(chat_id)
+        return await make_request(bot, method)
+
+
+# Общая очередь отправки для всех обработчиков
+scheduler = MessageScheduler()
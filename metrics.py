@@ -0,0 +1,355 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from aiohttp import web
+
+# Границы корзин гистограмм по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class _Metric:
+    """Базовый класс метрики с метками; значения изменяются под блокировкой (запись идет из потоков БД)"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """Установка значения счетчика, который ведется в другом компоненте (очередь отправки, FSM)"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    type_name = "gauge"
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Для каждого набора меток: количества по корзинам, сумма и общее количество
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][index] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self) -> List[str]:
+        lines = []
+        bucket_labels = self.label_names + ("le",)
+        for key, (counts, total, count) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + (_format_value(bound),))} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(bucket_labels, key + ('+Inf',))} {count}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик и функций сбора, вызываемых перед каждой выдачей"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus"""
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                logging.error(f"Ошибка сбора метрик: {e}")
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+handler_duration = registry.histogram(
+    "bot_handler_duration_seconds", "Время обработки события обработчиком", ("router", "event")
+)
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("router", "event")
+)
+db_query_duration = registry.histogram(
+    "bot_db_query_duration_seconds", "Время выполнения запроса к базе", ("db", "method")
+)
+messages_sent = registry.counter(
+    "bot_messages_sent_total", "Исходящие сообщения по источнику и результату", ("source", "result")
+)
+send_queue = registry.gauge(
+    "bot_send_queue", "Состояние очереди отправки", ("state",)
+)
+send_queue_total = registry.counter(
+    "bot_send_queue_events_total", "Итоги очереди отправки (отправлено, ошибки, RetryAfter, прямые отправки)", ("event",)
+)
+send_retry_after_seconds = registry.counter(
+    "bot_send_retry_after_seconds_total", "Суммарное ожидание по RetryAfter"
+)
+fsm_sessions = registry.gauge(
+    "bot_fsm_sessions", "FSM-сессии в кэше и ожидающие записи", ("state",)
+)
+fsm_cache_total = registry.counter(
+    "bot_fsm_cache_total", "Обращения к кэшу FSM-сессий и записи на диск", ("event",)
+)
+ticket_cache_size = registry.gauge(
+    "bot_ticket_cache_size", "Заявок в кэше"
+)
+ticket_cache_total = registry.counter(
+    "bot_ticket_cache_total", "Обращения к кэшу заявок", ("event",)
+)
+blocked_index_size = registry.gauge(
+    "bot_blocked_index_size", "Заблокированных пользователей в индексе в памяти"
+)
+blocked_index_total = registry.counter(
+    "bot_blocked_index_total", "Проверки блокировки по индексу в памяти и его перезагрузки", ("event",)
+)
+throttle_total = registry.counter(
+    "bot_throttle_total", "Обновления, пропущенные и отклоненные ограничением частоты", ("result",)
+)
+throttle_state = registry.gauge(
+    "bot_throttle_state", "Корзины ограничения частоты и пользователи с отклонениями за окно флуда", ("state",)
+)
+group_commit_total = registry.counter(
+    "bot_db_group_commit_total", "Групповая запись: commit и изменения в них", ("event",)
+)
+group_commit_pending = registry.gauge(
+    "bot_db_group_commit_pending", "Изменения в очереди групповой записи"
+)
+group_commit_size = registry.histogram(
+    "bot_db_group_commit_size", "Изменений в одном commit групповой записи",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+group_commit_latency = registry.histogram(
+    "bot_db_group_commit_latency_seconds", "Время от постановки первого изменения группы до ее commit"
+)
+event_loop_lag = registry.gauge(
+    "bot_event_loop_lag_seconds", "Последняя измеренная задержка event loop"
+)
+event_loop_lag_histogram = registry.histogram(
+    "bot_event_loop_lag_histogram_seconds", "Распределение задержки event loop"
+)
+
+
+class HandlerMetricsMiddleware:
+    """Внутренний middleware роутера: время обработки события найденным обработчиком"""
+
+    def __init__(self, router: str, event: str):
+        self.router = router
+        self.event = event
+
+    async def __call__(self, handler, event, data):
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            handler_errors.inc(router=self.router, event=self.event)
+            raise
+        finally:
+            handler_duration.observe(time.perf_counter() - started, router=self.router, event=self.event)
+
+
+def setup_router_metrics(routers: Dict[str, object]):
+    """Подключение замера времени обработчиков к роутерам {имя: роутер}"""
+    for name, router in routers.items():
+        router.message.middleware(HandlerMetricsMiddleware(name, "message"))
+        router.callback_query.middleware(HandlerMetricsMiddleware(name, "callback_query"))
+
+
+def track_scheduler(scheduler):
+    """Сбор метрик очереди отправки при каждой выдаче"""
+    def collect():
+        stats = scheduler.get_metrics()
+        send_queue.set(stats['queue_depth'], state="queued")
+        send_queue.set(stats['delayed'], state="delayed")
+        for priority, count in stats['pending'].items():
+            send_queue.set(count, state=f"pending_{priority}")
+        send_queue_total.set(stats['sent'], event="sent")
+        send_queue_total.set(stats['failed'], event="failed")
+        send_queue_total.set(stats['direct'], event="direct")
+        send_queue_total.set(stats['retry_after_count'], event="retry_after")
+        send_retry_after_seconds.set(stats['retry_after_seconds'])
+
+    registry.add_collector(collect)
+
+
+def track_fsm_storage(storage):
+    """Сбор метрик FSM-хранилища (SQLiteStorage.get_stats) при каждой выдаче"""
+    def collect():
+        stats = storage.get_stats()
+        fsm_sessions.set(stats['cached'], state="cached")
+        fsm_sessions.set(stats['dirty'], state="dirty")
+        fsm_cache_total.set(stats['hits'], event="hit")
+        fsm_cache_total.set(stats['misses'], event="miss")
+        fsm_cache_total.set(stats['flushes'], event="flush")
+
+    registry.add_collector(collect)
+
+
+def track_ticket_cache(db):
+    """Сбор метрик кэша заявок (get_cache_stats) при каждой выдаче"""
+    def collect():
+        stats = db.get_cache_stats()
+        if stats is None:
+            return
+        ticket_cache_size.set(stats['cached'])
+        ticket_cache_total.set(stats['hits'], event="hit")
+        ticket_cache_total.set(stats['misses'], event="miss")
+
+    registry.add_collector(collect)
+
+
+def track_throttler(throttler):
+    """Сбор метрик ограничения частоты (Throttler.get_stats) при каждой выдаче"""
+    def collect():
+        stats = throttler.get_stats()
+        throttle_total.set(stats['allowed'], result="allowed")
+        throttle_total.set(stats['throttled'], result="throttled")
+        throttle_state.set(stats['buckets'], state="buckets")
+        throttle_state.set(stats['flooding_users'], state="flooding_users")
+
+    registry.add_collector(collect)
+
+
+def track_group_commit(db):
+    """Сбор счетчиков групповой записи (get_group_commit_stats) при каждой выдаче;
+    размер и задержка групп пишутся в гистограммы при каждом commit"""
+    def collect():
+        stats = db.get_group_commit_stats()
+        group_commit_total.set(stats['commits'], event="commit")
+        group_commit_total.set(stats['ops'], event="op")
+        group_commit_pending.set(stats['pending'])
+
+    registry.add_collector(collect)
+
+
+def track_blocked_index(blocked_db):
+    """Сбор метрик индекса заблокированных пользователей (get_cache_stats) при каждой выдаче"""
+    def collect():
+        stats = blocked_db.get_cache_stats()
+        blocked_index_size.set(stats['size'])
+        blocked_index_total.set(stats['lookups'], event="lookup")
+        blocked_index_total.set(stats['hits'], event="hit")
+        blocked_index_total.set(stats['reloads'], event="reload")
+
+    registry.add_collector(collect)
+
+
+async def monitor_event_loop(interval: float = 0.5):
+    """Замер задержки event loop: насколько позже запланированного просыпается sleep"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - started - interval, 0.0)
+        event_loop_lag.set(lag)
+        event_loop_lag_histogram.observe(lag)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Запуск HTTP-сервера с эндпоинтом /metrics"""
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(),
+                            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logging.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,58 @@
+import logging
+import sqlite3
+import time
+from typing import Callable, List
+
+
+class Migration:
+    """Шаг изменения схемы: после успешного применения PRAGMA user_version = version"""
+
+    def __init__(self, version: int, description: str, apply: Callable[[sqlite3.Cursor], None]):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+def get_schema_version(conn: sqlite3.Connection, schema: str = "main") -> int:
+    return conn.execute(f"PRAGMA {schema}.user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, migrations: List[Migration], schema: str = "main",
+            name: str = "") -> int:
+    """Применение недостающих миграций по порядку; возвращает количество примененных
+
+    Каждый шаг выполняется в своей транзакции вместе с записью номера версии: прерванный
+    запуск продолжится с первого непримененного шага. Если схема актуальна, выполняется
+    только чтение user_version.
+    """
+    name = name or schema
+    current = get_schema_version(conn, schema)
+    latest = max(migration.version for migration in migrations)
+    if current >= latest:
+        if current > latest:
+            logging.warning(f"Версия схемы {name} ({current}) новее известной коду ({latest})")
+        return 0
+
+    if conn.in_transaction:
+        conn.commit()
+
+    applied = 0
+    for migration in sorted(migrations, key=lambda item: item.version):
+        if migration.version <= current:
+            continue
+
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration.apply(conn.cursor())
+            conn.execute(f"PRAGMA {schema}.user_version = {int(migration.version)}")
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logging.error(f"Ошибка миграции {name} до версии {migration.version}: {e}")
+            raise
+
+        applied += 1
+        logging.info(f"Схема {name}: версия {migration.version} - {migration.description} "
+                     f"({(time.perf_counter() - started) * 1000:.0f} мс)")
+    return applied
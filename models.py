@@ -15,20 +15,79 @@ class Rating(Enum):
     FOUR = "4"
     FIVE = "5"
 
-@dataclass
+# Поля заявки в порядке столбцов таблицы tickets
+TICKET_FIELDS = (
+    'id', 'user_id', 'full_name', 'room', 'problem', 'status', 'created_at',
+    'closed_by', 'closed_at', 'admin_response', 'rating', 'feedback'
+)
+
+
+def _parse_datetime(value) -> Optional[datetime]:
+    if not value or isinstance(value, datetime):
+        return value or None
+    return datetime.fromisoformat(value)
+
+
 class Ticket:
-    id: int
-    user_id: int
-    full_name: str
-    room: str
-    problem: str
-    status: TicketStatus
-    created_at: datetime
-    closed_by: Optional[str] = None
-    closed_at: Optional[datetime] = None
-    admin_response: Optional[str] = None
-    rating: Optional[int] = None
-    feedback: Optional[str] = None
+    """Заявка: компактный объект со __slots__, даты разбираются при первом обращении"""
+
+    __slots__ = ('id', 'user_id', 'full_name', 'room', 'problem', 'status', '_created_at',
+                 'closed_by', '_closed_at', 'admin_response', 'rating', 'feedback')
+
+    def __init__(self, id: int, user_id: int, full_name: str, room: str, problem: str,
+                 status: TicketStatus, created_at=None, closed_by: Optional[str] = None,
+                 closed_at=None, admin_response: Optional[str] = None, rating: Optional[int] = None,
+                 feedback: Optional[str] = None):
+        self.id = id
+        self.user_id = user_id
+        self.full_name = full_name
+        self.room = room
+        self.problem = problem
+        self.status = status if isinstance(status, TicketStatus) else TicketStatus(status)
+        # Строка из базы или datetime
+        self._created_at = created_at
+        self.closed_by = closed_by
+        self._closed_at = closed_at
+        self.admin_response = admin_response
+        self.rating = rating
+        self.feedback = feedback
+
+    @classmethod
+    def from_row(cls, row) -> "Ticket":
+        """Создание из строки tickets (sqlite3.Row или словарь), даты остаются строками до обращения"""
+        return cls(*(row[field] for field in TICKET_FIELDS))
+
+    @property
+    def created_at(self) -> Optional[datetime]:
+        if isinstance(self._created_at, str):
+            self._created_at = _parse_datetime(self._created_at)
+        return self._created_at
+
+    @created_at.setter
+    def created_at(self, value):
+        self._created_at = value
+
+    @property
+    def closed_at(self) -> Optional[datetime]:
+        if isinstance(self._closed_at, str):
+            self._closed_at = _parse_datetime(self._closed_at)
+        return self._closed_at
+
+    @closed_at.setter
+    def closed_at(self, value):
+        self._closed_at = value
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, field) for field in TICKET_FIELDS)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Ticket):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{field}={value!r}" for field, value in zip(TICKET_FIELDS, self._values()))
+        return f"Ticket({fields})"
 
 @dataclass
 class BlockedUser:
@@ -0,0 +1,182 @@
+import functools
+import inspect
+import logging
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+# Операторы, для которых имеет смысл EXPLAIN QUERY PLAN
+_EXPLAIN_PREFIXES = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT", "REPLACE")
+
+
+def fingerprint(sql: str) -> str:
+    """Нормализация запроса: литералы заменяются на ?, списки IN (...) сворачиваются"""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("(...)", sql)
+    return _SPACE_RE.sub(" ", sql).strip()
+
+
+class _Stat:
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration: float):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def as_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 2),
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0,
+            'max_ms': round(self.max * 1000, 2)
+        }
+
+
+class QueryProfiler:
+    """Профилирование запросов: trace callback sqlite3 и таймеры методов Database
+
+    Trace callback вызывается в начале каждого оператора, поэтому время оператора -
+    интервал до следующего оператора того же вызова метода (или до его завершения),
+    включая чтение результатов.
+    """
+
+    def __init__(self, slow_query_ms: float = 100, explain: Optional[Callable[[str], List[str]]] = None):
+        self.slow_query = slow_query_ms / 1000
+        self.explain = explain
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._statements: Dict[str, _Stat] = {}
+        self._methods: Dict[str, _Stat] = {}
+        self.slow_queries = 0
+
+    def trace(self, sql: str):
+        """Trace callback соединения: запоминает начало оператора в текущем вызове метода"""
+        calls = getattr(self._local, 'calls', None)
+        if calls is None or sql.startswith("--"):
+            return
+        # Программы триггеров сообщаются текстом родительского оператора - они входят в его время
+        if calls and calls[-1][0] == sql:
+            return
+        calls.append((sql, time.perf_counter()))
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """Обертка метода Database с замером времени и сбором выполненных операторов
+
+        Если метод возвращает генератор (iter_tickets), замер продолжается по мере его чтения.
+        """
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            outer = getattr(self._local, 'calls', None)
+            calls = self._local.calls = []
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except BaseException:
+                self._finish(name, time.perf_counter() - started, calls, outer)
+                raise
+            if inspect.isgenerator(result):
+                self._local.calls = outer
+                return self._iterate(name, result, calls, time.perf_counter() - started)
+            self._finish(name, time.perf_counter() - started, calls, outer)
+            return result
+
+        return wrapper
+
+    def _iterate(self, name: str, gen, calls: list, active: float):
+        """Чтение генератора метода: операторы и время учитываются только во время его шагов,
+        обработка строк потребителем между шагами в замер не входит"""
+        paused_at = time.perf_counter()
+        try:
+            while True:
+                resumed = time.perf_counter()
+                if calls:
+                    # Оператор, начатый до паузы, продолжается после нее: сдвигаем его начало
+                    sql, started = calls[-1]
+                    calls[-1] = (sql, started + resumed - paused_at)
+                outer = getattr(self._local, 'calls', None)
+                self._local.calls = calls
+                try:
+                    item = next(gen)
+                except StopIteration:
+                    return
+                finally:
+                    self._local.calls = outer
+                    paused_at = time.perf_counter()
+                    active += paused_at - resumed
+                yield item
+        finally:
+            gen.close()
+            self._finish(name, active, calls, getattr(self._local, 'calls', None), paused_at)
+
+    def _finish(self, name: str, duration: float, calls: list, outer, finished: Optional[float] = None):
+        # EXPLAIN медленных запросов не должен попасть в операторы внешнего вызова
+        self._local.calls = None
+        try:
+            self._record(name, duration, calls, finished or time.perf_counter())
+        finally:
+            self._local.calls = outer
+
+    def _record(self, method: str, duration: float, calls: list, finished: float):
+        timings = []
+        for index, (sql, started) in enumerate(calls):
+            ended = calls[index + 1][1] if index + 1 < len(calls) else finished
+            timings.append((sql, ended - started))
+
+        slow = [(sql, elapsed) for sql, elapsed in timings if elapsed >= self.slow_query]
+
+        with self._lock:
+            self._methods.setdefault(method, _Stat()).add(duration)
+            for sql, elapsed in timings:
+                self._statements.setdefault(fingerprint(sql), _Stat()).add(elapsed)
+            self.slow_queries += len(slow)
+
+        for sql, elapsed in slow:
+            self._log_slow(method, sql, elapsed)
+
+    def _log_slow(self, method: str, sql: str, elapsed: float):
+        plan = ""
+        if self.explain and sql.lstrip().upper().startswith(_EXPLAIN_PREFIXES):
+            try:
+                plan = "\n" + "\n".join(f"  {line}" for line in self.explain(sql))
+            except Exception as e:
+                plan = f"\n  (план недоступен: {e})"
+        logging.warning(f"Медленный запрос в {method}: {elapsed * 1000:.1f} мс\n"
+                        f"{_SPACE_RE.sub(' ', sql).strip()[:1000]}{plan}")
+
+    def get_top(self, limit: int = 10, order_by: str = 'total') -> Dict:
+        """Топ запросов по суммарному (total), среднему (avg) или максимальному (max) времени"""
+        def sort_key(item):
+            stat = item[1]
+            if order_by == 'max':
+                return stat.max
+            if order_by == 'avg':
+                return stat.total / stat.count if stat.count else 0
+            return stat.total
+
+        with self._lock:
+            statements = sorted(self._statements.items(), key=sort_key, reverse=True)[:limit]
+            methods = sorted(self._methods.items(), key=sort_key, reverse=True)[:limit]
+            return {
+                'statements': [dict(stat.as_dict(), sql=sql) for sql, stat in statements],
+                'methods': [dict(stat.as_dict(), method=name) for name, stat in methods],
+                'slow_queries': self.slow_queries
+            }
+
+    def reset(self):
+        with self._lock:
+            self._statements.clear()
+            self._methods.clear()
+            self.slow_queries = 0
@@ -0,0 +1,175 @@
+import contextvars
+import copy
+import json
+import logging
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Контекст текущего обновления: попадает в каждую запись лога
+update_id_var: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("update_id", default=None)
+user_id_var: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("user_id", default=None)
+ticket_id_var: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("ticket_id", default=None)
+
+CONTEXT_FIELDS = {"update_id": update_id_var, "user_id": user_id_var, "ticket_id": ticket_id_var}
+
+
+def bind_ticket(ticket_id: int):
+    """Привязка номера заявки к записям лога текущего обновления"""
+    ticket_id_var.set(ticket_id)
+
+
+class ContextQueueHandler(QueueHandler):
+    """QueueHandler, который в потоке вызова фиксирует сообщение и поля контекста
+
+    Форматирование и запись на диск выполняются в потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+
+        # Поля из extra={...} имеют приоритет над контекстом обновления
+        for field, var in CONTEXT_FIELDS.items():
+            if getattr(record, field, None) is None:
+                setattr(record, field, var.get())
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: update_id и user_id для записей лога"""
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        tokens = [
+            (update_id_var, update_id_var.set(event.update_id if isinstance(event, Update) else None)),
+            (user_id_var, user_id_var.set(user.id if user else None)),
+            (ticket_id_var, ticket_id_var.set(None)),
+        ]
+        try:
+            return await handler(event, data)
+        finally:
+            for var, token in reversed(tokens):
+                var.reset(token)
+
+
+def parse_level(value: str) -> Optional[int]:
+    """Числовой уровень по имени (DEBUG) или числу (10); None - неизвестный уровень"""
+    value = value.strip().upper()
+    if value.isdigit():
+        return int(value)
+    level = logging.getLevelName(value)
+    return level if isinstance(level, int) else None
+
+
+def parse_levels(value: str, invalid: Optional[List[str]] = None) -> Dict[str, int]:
+    """Разбор уровней модулей: "aiogram.event=WARNING,database=DEBUG"
+
+    Записи с неизвестным уровнем (опечатка вроде DEBG) пропускаются и добавляются в invalid.
+    """
+    levels = {}
+    for item in value.split(","):
+        if "=" in item:
+            name, level = item.split("=", 1)
+            number = parse_level(level)
+            if number is None:
+                if invalid is not None:
+                    invalid.append(item.strip())
+                continue
+            levels[name.strip()] = number
+    return levels
+
+
+class ModuleLevelFilter(logging.Filter):
+    """Уровни по модулям: для корневого логгера - по имени файла модуля (database, utils),
+    для именованных логгеров (aiogram.event) - по ближайшему заданному префиксу имени"""
+
+    def __init__(self, default: int, levels: Dict[str, int]):
+        super().__init__()
+        self.default = default
+        self.levels = levels
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name == "root":
+            threshold = self.levels.get(record.module, self.default)
+        else:
+            threshold = self.default
+            name = record.name
+            while name:
+                if name in self.levels:
+                    threshold = self.levels[name]
+                    break
+                name = name.rpartition(".")[0]
+        return record.levelno >= threshold
+
+
+def setup_structured_logging(level: str = "INFO", log_file: str = "bot.log", fmt: str = "text",
+                             rotate: str = "size", max_bytes: int = 10 * 1024 * 1024, backup_count: int = 5,
+                             when: str = "midnight", module_levels: str = "") -> QueueListener:
+    """Логирование через очередь: запись в файл с ротацией и в консоль выполняется в фоновом потоке"""
+    formatter = JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        if rotate == "time":
+            handlers.append(TimedRotatingFileHandler(log_file, when=when, backupCount=backup_count,
+                                                     encoding="utf-8"))
+        else:
+            handlers.append(RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                                encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Опечатка в уровне не должна мешать запуску: предупреждения - после настройки логирования
+    invalid = []
+    default = parse_level(level)
+    if default is None:
+        invalid.append(f"LOG_LEVEL={level}")
+        default = logging.INFO
+    levels = parse_levels(module_levels, invalid)
+    queue_handler = ContextQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(ModuleLevelFilter(default, levels))
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    # Корневой уровень - самый подробный из заданных, остальное отсекает ModuleLevelFilter
+    root.setLevel(min([default, *levels.values()]))
+
+    listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    listener.start()
+    for item in invalid:
+        logging.warning(f"Неизвестный уровень логирования пропущен: {item}")
+    return listener
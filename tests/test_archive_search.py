@@ -0,0 +1,71 @@
+from database import Database
+from models import TicketStatus
+
+
+def make_db(tmp_path) -> Database:
+    return Database(str(tmp_path / "tickets.db"), "WAL", "NORMAL", 5000, read_pool_size=1,
+                    archive_db_name=str(tmp_path / "archive.db"))
+
+
+def archive_all_closed(db: Database):
+    with db.pool.writer() as conn:
+        conn.execute("UPDATE tickets SET closed_at = DATETIME('now', '-100 days') WHERE status = 'closed'")
+        conn.commit()
+    db.archive_closed_tickets(older_than_days=90)
+
+
+def test_search_finds_archived_ticket(tmp_path):
+    db = make_db(tmp_path)
+    try:
+        archived_id = db.add_ticket(1, "Иван Петров", "101", "Не работает принтер в бухгалтерии")
+        db.update_ticket_status(archived_id, TicketStatus.CLOSED, "admin", "Заменен картридж")
+        open_id = db.add_ticket(2, "Анна Смирнова", "202", "Принтер печатает полосами")
+        archive_all_closed(db)
+
+        assert db.get_ticket(archived_id).status == TicketStatus.CLOSED
+        result = db.search_tickets("принтер")
+        assert {row["id"] for row in result["tickets"]} == {archived_id, open_id}
+
+        result = db.search_tickets("картридж")
+        assert [row["id"] for row in result["tickets"]] == [archived_id]
+        assert "«" in result["tickets"][0]["snippet"]
+    finally:
+        db.close()
+
+
+def test_search_pages_across_main_and_archive(tmp_path):
+    db = make_db(tmp_path)
+    try:
+        for user_id in range(6):
+            ticket_id = db.add_ticket(user_id, "Тест Тестов", "1", f"Сломалась клавиатура номер {user_id}")
+            if user_id % 2:
+                db.update_ticket_status(ticket_id, TicketStatus.CLOSED, "admin")
+        archive_all_closed(db)
+
+        seen = []
+        for offset in (0, 4):
+            result = db.search_tickets("клавиатура", limit=4, offset=offset)
+            seen.extend(row["id"] for row in result["tickets"])
+        assert sorted(seen) == list(range(1, 7))
+        assert result["has_next"] is False
+    finally:
+        db.close()
+
+
+def test_repeated_archiving_keeps_single_index_entry(tmp_path):
+    db = make_db(tmp_path)
+    try:
+        ticket_id = db.add_ticket(1, "Иван Петров", "101", "Нет доступа к сетевой папке")
+        db.update_ticket_status(ticket_id, TicketStatus.CLOSED, "admin")
+        archive_all_closed(db)
+
+        # Повтор переноса после сбоя: заявка еще есть в main и уже есть в архиве
+        with db.pool.writer() as conn:
+            conn.execute("INSERT INTO main.tickets SELECT * FROM archive.tickets WHERE id = ?", (ticket_id,))
+            conn.commit()
+        db.archive_closed_tickets(older_than_days=90)
+
+        result = db.search_tickets("сетевой папке")
+        assert [row["id"] for row in result["tickets"]] == [ticket_id]
+    finally:
+        db.close()
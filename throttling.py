@@ -0,0 +1,219 @@
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware, Bot, Dispatcher, Router
+from aiogram.types import CallbackQuery, Message, TelegramObject, Update
+
+from async_database import AsyncBlockedDatabase
+from config import Config
+from message_scheduler import TokenBucket, SendPriority
+from utils import enqueue_message
+
+THROTTLED_TEXT = "⏳ Слишком много запросов. Подождите несколько секунд."
+
+
+def parse_limits(value: str) -> Dict[str, Tuple[float, float]]:
+    """Разбор лимитов роутеров: "user=0.5/5,rating=1/3" (запросов в секунду / запас)"""
+    limits = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        name, limit = item.split("=", 1)
+        rate, _, burst = limit.partition("/")
+        limits[name.strip()] = (float(rate), float(burst or 1))
+    return limits
+
+
+class Throttler:
+    """Корзины токенов по пользователям и учет флуда
+
+    Области (scope): "global" - все обновления пользователя, имя роутера - события,
+    обработанные этим роутером, "blocked" - обновления заблокированных пользователей.
+    """
+
+    def __init__(self, rate: float, burst: float, router_limits: Dict[str, Tuple[float, float]],
+                 blocked_rate: float = 0.1, flood_threshold: int = 30, flood_window: float = 60,
+                 exempt_ids: Optional[set] = None):
+        self.limits = {"global": (rate, burst), "blocked": (blocked_rate, 1), **router_limits}
+        self.flood_threshold = flood_threshold
+        self.flood_window = flood_window
+        self.exempt_ids = exempt_ids or set()
+
+        self._buckets: Dict[Tuple[str, int], TokenBucket] = {}
+        # Время отклоненных обновлений и момент последнего предупреждения по пользователям
+        self._rejected: Dict[int, deque] = {}
+        self._warned_at: Dict[int, float] = {}
+
+        self.allowed = 0
+        self.throttled = 0
+
+    def allow(self, scope: str, user_id: int) -> bool:
+        """Списание токена; False - обновление нужно отбросить"""
+        rate, burst = self.limits.get(scope, (0, 0))
+        if not rate or user_id in self.exempt_ids:
+            return True
+
+        key = (scope, user_id)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) > 50000:
+                self._prune()
+            bucket = self._buckets[key] = TokenBucket(rate, burst)
+
+        if bucket.reserve() > 0:
+            # Отклоненное обновление не расходует токен
+            bucket.tokens += 1
+            self.throttled += 1
+            return False
+        self.allowed += 1
+        return True
+
+    def register_rejection(self, user_id: int) -> int:
+        """Учет отклоненного обновления; возвращает количество отклонений за окно флуда"""
+        now = time.monotonic()
+        rejected = self._rejected.setdefault(user_id, deque())
+        rejected.append(now)
+        while rejected and now - rejected[0] > self.flood_window:
+            rejected.popleft()
+        return len(rejected)
+
+    def should_warn(self, user_id: int) -> bool:
+        """Предупреждение о частых запросах - не чаще одного раза за окно флуда"""
+        now = time.monotonic()
+        if now - self._warned_at.get(user_id, 0) < self.flood_window:
+            return False
+        self._warned_at[user_id] = now
+        return True
+
+    def forget(self, user_id: int):
+        self._rejected.pop(user_id, None)
+        self._warned_at.pop(user_id, None)
+
+    def _prune(self):
+        """Удаление полных (неактивных) корзин и устаревших счетчиков отклонений"""
+        for key in [key for key, bucket in self._buckets.items() if bucket.is_idle()]:
+            del self._buckets[key]
+        now = time.monotonic()
+        for user_id in [user_id for user_id, rejected in self._rejected.items()
+                        if not rejected or now - rejected[-1] > self.flood_window]:
+            self.forget(user_id)
+
+    def get_stats(self) -> Dict:
+        return {
+            'allowed': self.allowed,
+            'throttled': self.throttled,
+            'buckets': len(self._buckets),
+            'flooding_users': len(self._rejected)
+        }
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Внешний middleware обновлений: общий лимит пользователя, отсечение заблокированных и автоблокировка"""
+
+    def __init__(self, throttler: Throttler, blocked_db: AsyncBlockedDatabase, config: Config,
+                 auto_block: bool = False):
+        self.throttler = throttler
+        self.blocked_db = blocked_db
+        self.config = config
+        self.auto_block = auto_block
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        # Заблокированные пользователи: проверка по индексу в памяти и отдельный строгий лимит
+        if await self.blocked_db.is_user_blocked(user.id):
+            if not self.throttler.allow("blocked", user.id):
+                return None
+            return await handler(event, data)
+
+        if self.throttler.allow("global", user.id):
+            return await handler(event, data)
+
+        await self.reject(event, user.id, data["bot"])
+        return None
+
+    async def reject(self, event: TelegramObject, user_id: int, bot: Bot):
+        """Отклонение обновления: однократное предупреждение пользователю и учет флуда"""
+        if isinstance(event, Update):
+            event = event.event
+
+        if self.throttler.should_warn(user_id):
+            try:
+                if isinstance(event, CallbackQuery):
+                    await event.answer(THROTTLED_TEXT, show_alert=True)
+                elif isinstance(event, Message):
+                    await event.answer(THROTTLED_TEXT)
+            except Exception as e:
+                logging.error(f"Не удалось предупредить пользователя {user_id} о лимите: {e}")
+        elif isinstance(event, CallbackQuery):
+            # Без ответа кнопка остается в состоянии загрузки
+            try:
+                await event.answer()
+            except Exception:
+                pass
+
+        await self.on_rejected(user_id, bot)
+
+    async def on_rejected(self, user_id: int, bot: Bot):
+        rejected = self.throttler.register_rejection(user_id)
+        if not self.auto_block or rejected < self.throttler.flood_threshold:
+            return
+
+        self.throttler.forget(user_id)
+        blocked = await self.blocked_db.block_user(user_id, blocked_by=0, reason="Автоблокировка: флуд")
+        if not blocked:
+            return
+        logging.warning(f"Пользователь {user_id} заблокирован автоматически: {rejected} отклоненных запросов "
+                        f"за {self.throttler.flood_window:.0f} с")
+
+        enqueue_message(
+            bot=bot,
+            chat_id=self.config.SUPPORT_CHAT_ID,
+            text=f"🚫 Пользователь {user_id} заблокирован автоматически за флуд.\n"
+                 f"🔓 Разблокировать: /unblock {user_id}",
+            priority=SendPriority.DIGEST
+        )
+
+
+class RouterThrottlingMiddleware(BaseMiddleware):
+    """Внутренний middleware роутера: лимит на события, обработанные этим роутером"""
+
+    def __init__(self, outer: ThrottlingMiddleware, scope: str):
+        self.outer = outer
+        self.scope = scope
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user = data.get("event_from_user")
+        if user is None or self.outer.throttler.allow(self.scope, user.id):
+            return await handler(event, data)
+
+        await self.outer.reject(event, user.id, data["bot"])
+        return None
+
+
+def setup_throttling(dp: Dispatcher, routers: Dict[str, Router], blocked_db: AsyncBlockedDatabase,
+                     config: Config) -> Throttler:
+    """Подключение ограничения частоты запросов к диспетчеру и роутерам"""
+    throttler = Throttler(
+        rate=config.THROTTLE_RATE,
+        burst=config.THROTTLE_BURST,
+        router_limits=parse_limits(config.THROTTLE_ROUTER_LIMITS),
+        blocked_rate=config.THROTTLE_BLOCKED_RATE,
+        flood_threshold=config.FLOOD_THRESHOLD,
+        flood_window=config.FLOOD_WINDOW,
+        exempt_ids=set(config.ADMIN_IDS)
+    )
+    middleware = ThrottlingMiddleware(throttler, blocked_db, config, auto_block=config.FLOOD_AUTO_BLOCK)
+    dp.update.outer_middleware(middleware)
+
+    for name, router in routers.items():
+        if name in throttler.limits:
+            router.message.middleware(RouterThrottlingMiddleware(middleware, name))
+            router.callback_query.middleware(RouterThrottlingMiddleware(middleware, name))
+    return throttler
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from models import Ticket
+
+
+class TicketCache:
+    """LRU-кэш заявок по ID для Database
+
+    Методы изменения заявок обновляют кэш сразу после commit (write-through). Чтение из
+    потоков пула кладет заявку в кэш, только если за время запроса не было записей:
+    иначе прочитанная строка могла устареть.
+    """
+
+    def __init__(self, max_size: int = 1000):
+        self.max_size = max_size
+        self._tickets: "OrderedDict[int, Ticket]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Номер последней записи: чтение сравнивает его до и после запроса
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, ticket_id: int) -> Optional[Ticket]:
+        with self._lock:
+            ticket = self._tickets.get(ticket_id)
+            if ticket is None:
+                self.misses += 1
+                return None
+            self._tickets.move_to_end(ticket_id)
+            self.hits += 1
+            return ticket
+
+    def put(self, ticket: Ticket):
+        """Запись заявки после изменения в базе"""
+        with self._lock:
+            self.generation += 1
+            self._store(ticket)
+
+    def put_loaded(self, ticket: Ticket, generation: int):
+        """Заявка, прочитанная из базы; пропускается, если после начала чтения были записи"""
+        with self._lock:
+            if generation == self.generation:
+                self._store(ticket)
+
+    def invalidate(self, ticket_id: int):
+        with self._lock:
+            self.generation += 1
+            self._tickets.pop(ticket_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._tickets.clear()
+
+    def _store(self, ticket: Ticket):
+        self._tickets[ticket.id] = ticket
+        self._tickets.move_to_end(ticket.id)
+        while len(self._tickets) > self.max_size:
+            self._tickets.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        """Статистика кэша заявок"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'cached': len(self._tickets),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 3) if total else 0
+            }
@@ -1,33 +1,62 @@
+import asyncio
 import logging
+from logging.handlers import QueueListener
 from typing import Optional
 from aiogram import Bot
 from aiogram.types import Message
 from datetime import datetime
 
+from config import Config
 from models import Ticket, TicketStatus
 from database import Database
-
-
-# Настройка логирования
-def setup_logging():
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('bot.log', encoding='utf-8'),
-            logging.StreamHandler()
-        ]
+from message_scheduler import scheduler, SendPriority
+from metrics import messages_sent
+from structured_logging import setup_structured_logging
+
+
+# Настройка логирования (запись в файл и консоль в фоновом потоке)
+def setup_logging(config: Config) -> QueueListener:
+    return setup_structured_logging(
+        level=config.LOG_LEVEL,
+        log_file=config.LOG_FILE,
+        fmt=config.LOG_FORMAT,
+        rotate=config.LOG_ROTATE,
+        max_bytes=config.LOG_MAX_BYTES,
+        backup_count=config.LOG_BACKUP_COUNT,
+        when=config.LOG_ROTATE_WHEN,
+        module_levels=config.LOG_LEVELS
     )
 
-async def safe_send_message(bot: Bot, chat_id: int, text: str, **kwargs):
+async def safe_send_message(bot: Bot, chat_id: int, text: str,
+                            priority: SendPriority = SendPriority.USER, **kwargs):
     try:
-        await bot.send_message(chat_id, text, **kwargs)
+        await scheduler.send_message(bot, chat_id, text, priority=priority, **kwargs)
         logging.info(f"Сообщение отправлено в чат {chat_id}")
+        messages_sent.inc(source="safe_send_message", result="ok")
         return True
     except Exception as e:
         logging.error(f"Ошибка отправки в чат {chat_id}: {e}")
+        messages_sent.inc(source="safe_send_message", result="error")
         return False
 
+# Постановка сообщения в очередь без ожидания отправки (результат - в лог и метрики)
+def enqueue_message(bot: Bot, chat_id: int, text: str,
+                    priority: SendPriority = SendPriority.USER, **kwargs) -> asyncio.Future:
+    def done(future: asyncio.Future):
+        if future.cancelled():
+            logging.warning(f"Отправка в чат {chat_id} отменена")
+            messages_sent.inc(source="enqueue_message", result="error")
+        elif future.exception():
+            logging.error(f"Ошибка отправки в чат {chat_id}: {future.exception()}")
+            messages_sent.inc(source="enqueue_message", result="error")
+        else:
+            logging.info(f"Сообщение отправлено в чат {chat_id}")
+            messages_sent.inc(source="enqueue_message", result="ok")
+
+    future = scheduler.submit(bot, chat_id, text, priority=priority, **kwargs)
+    future.add_done_callback(done)
+    return future
+
 # Форматирование заявки для отправки
 def format_ticket_message(ticket: Ticket) -> str:
     status_emoji = {
@@ -58,10 +87,12 @@ def format_ticket_message(ticket: Ticket) -> str:
 # Отправка уведомления пользователю
 async def notify_user(bot: Bot, user_id: int, message: str) -> bool:
     try:
-        await bot.send_message(user_id, message)
+        await scheduler.send_message(bot, user_id, message, priority=SendPriority.USER)
+        messages_sent.inc(source="notify_user", result="ok")
         return True
     except Exception as e:
         logging.error(f"Не удалось отправить сообщение пользователю {user_id}: {e}")
+        messages_sent.inc(source="notify_user", result="error")
         return False
 
 
@@ -80,28 +111,7 @@ def validate_problem(problem: str) -> bool:
 
 # Получение статистики заявок
 def get_tickets_stats(db: Database) -> dict:
-    with db.conn:
-        cursor = db.conn.cursor()
-
-        # Общее количество заявок
-        cursor.execute("SELECT COUNT(*) FROM tickets")
-        total = cursor.fetchone()[0]
-
-        # Заявки по статусам
-        cursor.execute("SELECT status, COUNT(*) FROM tickets GROUP BY status")
-        status_stats = {row[0]: row[1] for row in cursor.fetchall()}
-
-        # Заявки за сегодня
-        cursor.execute("SELECT COUNT(*) FROM tickets WHERE DATE(created_at) = DATE('now')")
-        today = cursor.fetchone()[0]
-
-        return {
-            'total': total,
-            'open': status_stats.get('open', 0),
-            'in_progress': status_stats.get('in_progress', 0),
-            'closed': status_stats.get('closed', 0),
-            'today': today
-        }
+    return db.get_tickets_stats()
 
 
 # Безопасное получение информации о пользователе
@@ -140,14 +150,18 @@ async def ask_for_rating(bot: Bot, user_id: int, ticket_id: int):
     """Отправка запроса на оценку заявки"""
     try:
         from keyboards import get_rating_keyboard
-        await bot.send_message(
+        await scheduler.send_message(
+            bot,
             user_id,
             "⭐ Оцените работу технического специалиста:\n\n"
             "Пожалуйста, оцените качество обслуживания по вашей заявке:\n",
+            priority=SendPriority.USER,
             reply_markup=get_rating_keyboard(ticket_id)
         )
         logging.info(f"Запрос на оценку отправлен пользователю {user_id} для заявки #{ticket_id}")
+        messages_sent.inc(source="ask_for_rating", result="ok")
         return True
     except Exception as e:
         logging.error(f"Ошибка отправки запроса на оценку пользователю {user_id}: {e}")
+        messages_sent.inc(source="ask_for_rating", result="error")
         return False
\ No newline at end of file
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from config import Config
+
+
+def create_webhook_app(bot: Bot, dp: Dispatcher, config: Config) -> web.Application:
+    """Создание aiohttp-приложения для приёма обновлений через webhook"""
+    app = web.Application()
+
+    # Ответ 200 отправляется сразу, обновление обрабатывается в фоне
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.WEBHOOK_SECRET or None,
+        handle_in_background=True
+    ).register(app, path=config.WEBHOOK_PATH)
+
+    # Запуск и остановка диспетчера вместе с приложением
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher, config: Config):
+    """Запуск webhook-сервера и регистрация webhook в Telegram
+
+    Без WEBHOOK_SECRET публичный эндпоинт принимал бы обновления от кого угодно: при
+    регистрации webhook (WEBHOOK_URL) запуск отменяется, иначе выводится предупреждение.
+    """
+    if not config.WEBHOOK_SECRET:
+        if config.WEBHOOK_URL:
+            raise RuntimeError("WEBHOOK_SECRET не задан: webhook без проверки секретного токена не регистрируется")
+        logging.warning("WEBHOOK_SECRET не задан: заголовок X-Telegram-Bot-Api-Secret-Token не проверяется, "
+                        "эндпоинт должен быть доступен только через доверенный прокси")
+
+    app = create_webhook_app(bot, dp, config)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.WEBAPP_HOST, config.WEBAPP_PORT)
+    await site.start()
+    logging.info(f"Webhook-сервер запущен на {config.WEBAPP_HOST}:{config.WEBAPP_PORT}{config.WEBHOOK_PATH}")
+
+    try:
+        if config.WEBHOOK_URL:
+            await bot.set_webhook(
+                url=config.WEBHOOK_URL.rstrip("/") + config.WEBHOOK_PATH,
+                secret_token=config.WEBHOOK_SECRET or None,
+                allowed_updates=dp.resolve_used_update_types(),
+                drop_pending_updates=True
+            )
+            logging.info(f"Webhook зарегистрирован: {config.WEBHOOK_URL}")
+        else:
+            logging.warning("WEBHOOK_URL не задан, webhook в Telegram не зарегистрирован")
+
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import logging
+import time
+
+import aiohttp
+from aiohttp import web
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+
+from config import load_config
+from webhook import create_webhook_app
+
+logging.basicConfig(level=logging.INFO)
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    """Синтетическое обновление с текстовым сообщением"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "first_name": "Test"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": text
+        }
+    }
+
+
+async def post_updates(url: str, secret: str, count: int, concurrency: int) -> list:
+    """Отправка обновлений на webhook; возвращает (статус, задержка) для каждого запроса"""
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+
+    async with aiohttp.ClientSession() as session:
+        async def post(update_id: int):
+            async with semaphore:
+                started = time.perf_counter()
+                async with session.post(url, json=make_update(update_id, 1000 + update_id % 50, "/selftest"),
+                                        headers=headers) as response:
+                    await response.read()
+                    return response.status, time.perf_counter() - started
+
+        return await asyncio.gather(*[post(update_id) for update_id in range(1, count + 1)])
+
+
+def report(results: list):
+    latencies = sorted(latency for _, latency in results)
+    ok = sum(1 for status, _ in results if status == 200)
+    logging.info(f"Ответов 200: {ok}/{len(results)}")
+    if latencies:
+        p50 = latencies[len(latencies) // 2] * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        logging.info(f"Задержка ответа: p50 {p50:.2f} мс, p99 {p99:.2f} мс")
+    return ok == len(results)
+
+
+async def run_local(count: int, concurrency: int) -> bool:
+    """Проверка webhook-сервера на локальном порту с диспетчером, который только считает обновления"""
+    config = load_config()
+    config.WEBHOOK_PATH = "/webhook"
+    config.WEBHOOK_SECRET = "selftest-secret"
+
+    received = set()
+    done = asyncio.Event()
+    router = Router()
+
+    @router.message()
+    async def record_update(message: Message):
+        received.add(message.message_id)
+        if len(received) >= count:
+            done.set()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="123456:selftest")
+
+    app = create_webhook_app(bot, dp, config)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}{config.WEBHOOK_PATH}"
+
+    try:
+        # Запрос с неверным секретом должен быть отклонён
+        rejected = await post_updates(url, "wrong-secret", 1, 1)
+        secret_ok = rejected[0][0] == 401
+        logging.info(f"Проверка секрета: {'OK' if secret_ok else 'ОШИБКА'} (статус {rejected[0][0]})")
+
+        results = await post_updates(url, config.WEBHOOK_SECRET, count, concurrency)
+        responses_ok = report(results)
+
+        try:
+            await asyncio.wait_for(done.wait(), timeout=10)
+        except asyncio.TimeoutError:
+            pass
+        processed_ok = len(received) == count
+        logging.info(f"Обработано в фоне: {len(received)}/{count}")
+
+        return secret_ok and responses_ok and processed_ok
+    finally:
+        await runner.cleanup()
+        await bot.session.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Самопроверка webhook-режима")
+    parser.add_argument("--url", help="адрес запущенного webhook-сервера (по умолчанию - локальный тестовый)")
+    parser.add_argument("--secret", default="", help="секретный токен для --url")
+    parser.add_argument("--count", type=int, default=200, help="количество обновлений")
+    parser.add_argument("--concurrency", type=int, default=20, help="параллельных запросов")
+    args = parser.parse_args()
+
+    if args.url:
+        success = report(await post_updates(args.url, args.secret, args.count, args.concurrency))
+    else:
+        success = await run_local(args.count, args.concurrency)
+
+    logging.info("Самопроверка пройдена" if success else "Самопроверка не пройдена")
+    raise SystemExit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())